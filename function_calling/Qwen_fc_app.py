@@ -1,216 +1,664 @@
+import os
+import re
 import json
 import time
-import re
+import uuid
 import requests
+import httpx
 from rich.console import Console
 import gradio as gr
 
 # Load all tool modules via registry
 import tools
-from registry import available_functions, definitions
-from template import function_calling_prompt_template, system_prompt, slack_prompt, switch_to_answer_prompt
+from registry import registry, definitions, render_tool_result
+from executor import aexecute_tool_calls
+from template import switch_to_answer_prompt, structured_selection_prompt, structured_repair_prompt, direct_answer_prompt
+from prompt_builder import build_chat_messages, continue_chat
+from llm_client import client
+from context_window import new_context
+from session_store import sessions
+from selection_cache import selection_cache, SELECTION_CACHE
+from intent_router import intent_router, INTENT_ROUTER
+from transcript import render_transcript, hidden_count, full_tool_output, TRANSCRIPT_MESSAGES
+from tool_router import router
+from llm_scheduler import scheduler, SchedulerBusy
+from telemetry import Trace, metrics, start_metrics_server, METRICS_PORT
+from tool_cache import cache_stats
+from rate_limit import rate_limiter
+from speculative_answer import speculate, speculation_stats, SPECULATIVE_ANSWER
+from tool_call_parser import ToolCallStreamParser, parse_structured_selection
 
 console = Console()
 
-OLLAMA_URL = "http://localhost:11434/api/generate"
-HEADERS = {"Content-Type": "application/json"}
 MODEL = "qwen2.5:latest"
+# Continue the selection conversation for the answer instead of sending a fresh prompt
+ANSWER_CONTINUATION = os.environ.get("ANSWER_CONTINUATION", "1") == "1"
+# Chat turns Gradio runs at the same time (the pipeline is async, so this is not bound by worker threads)
+GRADIO_CONCURRENCY = int(os.environ.get("GRADIO_CONCURRENCY", "32"))
+# "text": free-form "[TOOL_CALLS] [...]" output parsed while streaming
+# "structured": output constrained to a JSON schema generated from the registry
+SELECTION_MODE = os.environ.get("SELECTION_MODE", "text")
+# Repair rounds for a structured reply that still fails validation
+SELECTION_REPAIRS = int(os.environ.get("SELECTION_REPAIRS", "1"))
+# Start of a structured reply up to its decision: "]" (no tool) or "{" (a call)
+STRUCTURED_DECISION_RE = re.compile(r'\s*\{\s*"tool_calls"\s*:\s*\[\s*([\]{])')
 
-# New: Structured message object: role, name, content
-def format_messages(messages):
+def selection_prompt(question, messages, context, trace):
     """
-    Formats the chat history as a message list:
-    Each message is a dict: {role: ..., content: ..., [name: ...]}
+    Builds the selection chat: static instructions + tool definitions first,
+    conversation last (prefix-stable). Sets context["definitions"].
     """
-    formatted = ""
-    for msg in messages:
-        if msg["role"] == "tool":
-            formatted += f'Tool [{msg["name"]}]: {msg["content"]}\n'
-        elif msg["role"] == "system":
-            formatted += f'System: {msg["content"]}\n'
-        else:
-            formatted += f'{msg["role"].capitalize()}: {msg["content"]}\n'
-    return formatted
-
-def extract_function_calls(question, messages=None):
-    # Build prompt with messages (rich context) + tool instructions
-    messages = messages or []
-    # Only show the last N messages to stay under context window
-    truncated = messages[-12:] if len(messages) > 12 else messages
-
-    chat_context = format_messages(truncated)
-    prompt = (
-        chat_context +
-        function_calling_prompt_template
-            .replace("%%tool_definitions%%", json.dumps(definitions))
-            .replace("%%question%%", question)
-    )
+    # History is fitted to the selection stage's token budget
+    window = context["select"]
+    with trace.span("prompt_build", llm="select"):
+        # Only the tools relevant to this question (all of them for small registries)
+        context["definitions"] = router.select(question, messages, definitions)
+        instruction = structured_selection_prompt if SELECTION_MODE == "structured" else None
+        return window.record(build_chat_messages(window.fit(messages), context["definitions"], instruction))
+
+def start_speculative_answer(chat, context, trace):
+    """
+    Starts a direct (no-tool) answer next to a structured selection call, or
+    returns None. It continues the selection chat minus its trailing
+    instruction, so Ollama reuses the prefilled prefix. In text mode a reply
+    without tools already streams from the selection call itself.
+    """
+    if not SPECULATIVE_ANSWER or SELECTION_MODE != "structured":
+        return None
+    data = {"model": MODEL, "messages": continue_chat(chat[:-1], [], direct_answer_prompt), "stream": True}
+    return speculate(context["session"], data, trace)
+
+def selection_reply(fn_calls):
+    """
+    The selection output the model would have given for these calls, so the
+    answer stage continues the selection chat the same way for decisions
+    made without the model.
+    """
+    if SELECTION_MODE == "structured":
+        return json.dumps({"tool_calls": fn_calls, "answer": ""})
+    return f"[TOOL_CALLS] {json.dumps(fn_calls)}"
 
+def routed_function_calls(question, context, chat, trace):
+    """
+    The decision for a question matching a tool's declared intent (see
+    intent_router), as the ("done", ...) event of stream_function_calls, or
+    None when the model has to decide.
+    """
+    start = time.perf_counter()
+    fn_calls = intent_router.route(question)
+    trace.add("intent_route", time.perf_counter() - start, start=start, llm="select",
+              status="fallback" if fn_calls is None else "routed")
+    if fn_calls is None:
+        return None
+    context["selection_chat"] = chat
+    return "done", selection_reply(fn_calls), fn_calls, None, time.perf_counter() - start
+
+def cached_function_calls(question, messages, context, chat, trace):
+    """
+    The decision for a repeated question from the selection cache, as the
+    ("done", ...) event of stream_function_calls, or None on a miss.
+    """
+    start = time.perf_counter()
+    fn_calls = selection_cache.lookup(question, messages, registry.names(context["definitions"]))
+    trace.add("select_cache", time.perf_counter() - start, start=start, llm="select",
+              cache="miss" if fn_calls is None else "hit")
+    if fn_calls is None:
+        return None
+    context["selection_chat"] = chat
+    return "done", selection_reply(fn_calls), fn_calls, None, time.perf_counter() - start
+
+async def stream_function_calls(question, messages=None, context=None, chat=None, speculative=None):
+    """
+    Runs the tool-selection call (streamed in text mode, schema-constrained in
+    structured mode) for the selection prompt, `chat` when the caller already built it.
+    `speculative`: a SpeculativeAnswer racing the structured call (see speculative_answer).
+    Yields ("text", partial_text) while the model answers in plain text, then
+    ("done", raw, fn_calls, error, duration). Valid decisions are added to the
+    selection cache.
+    """
+    messages = messages or [{"role": "user", "content": question}]
+    context = context if context is not None else new_context()
+    trace = context.get("trace") or Trace()
+    if chat is None:
+        chat = selection_prompt(question, messages, context, trace)
+    names = registry.names(context["definitions"])
+    if SELECTION_MODE == "structured":
+        source = structured_function_calls(chat, context, trace, speculative)
+    else:
+        source = text_function_calls(chat, context, trace)
+    async for event in source:
+        if SELECTION_CACHE and event[0] == "done" and event[2] and not event[3]:
+            selection_cache.store(question, messages, names, event[2], event[4])
+        yield event
+
+async def text_function_calls(chat, context, trace):
+    """
+    Streams the selection call. The generation is stopped as soon as a
+    complete tool-call array has arrived.
+    """
     data = {
         "model": MODEL,
-        "prompt": prompt,
-        "stream": False
+        "messages": chat,
+        "stream": True
     }
+    # The answer stage continues exactly this conversation
+    context["selection_chat"] = data["messages"]
 
     start = time.time()
-    response = requests.post(OLLAMA_URL, headers=HEADERS, data=json.dumps(data))
-    end = time.time()
-
-    if response.status_code != 200:
-        return None, None, f"HTTP error: {response.status_code}", end - start
+    parser = ToolCallStreamParser()
+    text = ""
+    stats = None
+    first_chunk = None
+    parse_time = 0.0
+    requested = time.perf_counter()
+    stream = client.astream(data, endpoint="chat")
+    try:
+        async for chunk in stream:
+            if first_chunk is None:
+                first_chunk = time.perf_counter()
+            if chunk.get("done"):
+                stats = chunk
+            parse_start = time.perf_counter()
+            released = parser.feed(chunk.get("message", {}).get("content", ""))
+            parse_time += time.perf_counter() - parse_start
+            if released:
+                text += released
+                yield "text", text
+            if parser.done:
+                break
+    except httpx.HTTPError as e:
+        yield "done", parser.buffer or None, None, f"Request error: {e}", time.time() - start
+        return
+    finally:
+        # Closing the response early aborts the rest of the generation
+        await stream.aclose()
+        trace.generation("select", stats, requested, first_chunk, time.perf_counter())
 
-    body = response.json()
-    raw = body.get("response", "")
+    parse_start = time.perf_counter()
+    released = parser.finish()
+    trace.add("parse", parse_time + time.perf_counter() - parse_start, llm="select")
+    if released:
+        text += released
+        yield "text", text
+    yield "done", parser.buffer, parser.calls, None, time.time() - start
 
+async def streamed_structured_selection(data, speculative, trace):
+    """
+    Streams a structured selection request while a speculative answer runs and
+    reads the decision from its first tokens ({"tool_calls": [ ...). An empty
+    list stops the request and returns None: the speculative answer is the
+    reply. As soon as a call starts, the speculative answer is cancelled.
+    Otherwise returns the final chunk with the whole reply as its message.
+    """
+    raw = ""
+    stats = None
+    first_chunk = None
+    requested = time.perf_counter()
+    stream = client.astream(data, endpoint="chat")
     try:
-        json_match = re.search(r"\[\s*{.*?}\s*]", raw, re.DOTALL)
-        if not json_match:
-            return raw, None, None, end - start
-        json_str = json_match.group(0).replace('\\', '')
-        fn_calls = json.loads(json_str)
-        return raw, fn_calls, None, end - start
-    except Exception as e:
-        return raw, None, None, end - start
-
-def call_function(function_calls):
-    if not function_calls:
-        return []
-    call = function_calls[0]
-    fn_name = call["name"]
-    args = call.get("arguments", {})
-    result = available_functions[fn_name](**args)
-    return [result]
-
-def answer_question(question, fn_responses, messages=None):
+        async for chunk in stream:
+            if first_chunk is None:
+                first_chunk = time.perf_counter()
+            if chunk.get("done"):
+                stats = chunk
+            raw += chunk.get("message", {}).get("content", "")
+            decision = STRUCTURED_DECISION_RE.match(raw)
+            if decision and decision.group(1) == "]":
+                return None
+            if decision:
+                speculative.cancel()
+    finally:
+        await stream.aclose()
+        trace.generation("select", stats, requested, first_chunk, time.perf_counter())
+    # No early decision (e.g. "answer" came first): the selection's own reply is used
+    speculative.cancel()
+    return {**(stats or {}), "message": {"role": "assistant", "content": raw}}
+
+async def structured_function_calls(chat, context, trace=None, speculative=None):
+    """
+    Selection with Ollama's `format` set to the registry's selection schema, so
+    the reply is always a parseable {"tool_calls": [...], "answer": "..."} object.
+    Calls are checked with registry.validate; a failing reply gets a short
+    repair message appended to the same conversation (only the new messages are
+    prefilled) instead of a full re-prompt. With a `speculative` answer running,
+    the first request is streamed so a "no tool" decision switches to it early
+    (see streamed_structured_selection). Yields the same events as
+    stream_function_calls.
+    """
+    trace = trace or Trace()
+    schema = registry.selection_schema(context["definitions"])
+    start = time.time()
+    body = None
+    if speculative is not None:
+        context["selection_chat"] = context["select"].record(chat)
+        try:
+            body = await streamed_structured_selection(
+                {"model": MODEL, "messages": chat, "format": schema}, speculative, trace)
+        except httpx.HTTPError as e:
+            yield "done", None, None, f"Request error: {e}", time.time() - start
+            return
+        if body is None:
+            # No tool needed: stream the direct answer generated meanwhile
+            answer = ""
+            async for answer in speculative.stream():
+                yield "text", answer
+            if not speculative.error:
+                yield "done", answer, None, None, time.time() - start
+                return
+            # It failed: ask the selection call for the whole reply after all
+    for _ in range(SELECTION_REPAIRS + 1):
+        if body is None:
+            context["selection_chat"] = context["select"].record(chat)
+            requested = time.perf_counter()
+            try:
+                response = await client.agenerate({"model": MODEL, "messages": chat, "format": schema}, endpoint="chat")
+            except httpx.HTTPError as e:
+                yield "done", None, None, f"Request error: {e}", time.time() - start
+                return
+            if response.status_code != 200:
+                yield "done", response.text, None, f"HTTP {response.status_code}", time.time() - start
+                return
+            body = response.json()
+            trace.generation("select", body, requested, None, time.perf_counter())
+        with trace.span("parse", llm="select"):
+            raw = body.get("message", {}).get("content", "")
+            answer, fn_calls, problems = parse_structured_selection(raw)
+            for call in fn_calls or []:
+                name, _, error = registry.validate(call)
+                if error:
+                    problems.append(f"{name}: {', '.join(error.get('details') or [error['error']])}")
+        if not problems:
+            break
+        chat = continue_chat(chat, [{"role": "assistant", "content": raw}, {
+            "role": "user",
+            "content": structured_repair_prompt.replace("%%errors%%", "; ".join(problems)).strip(),
+        }])
+        body = None
+    else:
+        # Still invalid: hand the calls to the executor, which reports the errors per call
+        answer = answer or raw
+
+    if fn_calls:
+        yield "done", raw, fn_calls, None, time.time() - start
+    else:
+        yield "text", answer
+        yield "done", answer, None, None, time.time() - start
+
+def describe_call(call):
+    """
+    Short description of a tool call for notes to the user, e.g. send_slack_message(channel='#alerts', ...).
+    """
+    arguments = call.get("arguments") or {}
+    shown = ", ".join(f"{key}={value!r}" for key, value in arguments.items())
+    return f'{call.get("name")}({shown})'
+
+def tool_message(name, result):
+    """
+    Builds the tool message stored in the history for a tool result.
+    """
+    return {
+        "role": "tool",
+        "name": name,
+        "content": render_tool_result(name, result)
+    }
+
+async def answer_question(question, fn_responses, messages=None, selection_raw=None, context=None):
     """
     After tool execution, instruct the LLM to answer using the latest tool result.
+    `messages` is the history up to and including the user's question (and usually the tool result).
+    When `selection_raw` (the model's tool-call output) is given and ANSWER_CONTINUATION is on,
+    the selection conversation is replayed unchanged and continued with the tool call, the tool
+    result and the answer instruction, so Ollama only prefills those new messages.
+    `context` holds the per-stage context windows (see context_window.new_context).
+    Yields the partial answer each time a streamed chunk adds text.
     """
-    messages = messages or []
+    messages = messages or [{"role": "user", "content": question}]
+    context = context or new_context()
+    trace = context.get("trace") or Trace()
+    build_start = time.perf_counter()
     full_messages = messages.copy()
-    if fn_responses:
+    if fn_responses and full_messages[-1]["role"] != "tool":
         # Add the tool output as a message
-        tool_msg = {
-            "role": "tool",
-            "name": fn_responses[0].get("name", "tool") if isinstance(fn_responses[0], dict) else "tool",
-            "content": json.dumps(fn_responses[0], indent=2) if isinstance(fn_responses[0], dict) else str(fn_responses[0])
-        }
-        full_messages.append(tool_msg)
-
-    formatted = format_messages(full_messages[-12:])
-
-    full_prompt = (
-        f"{system_prompt.strip()}\n\n"
-        f"{slack_prompt.strip()}\n\n"
-        f"{formatted}\n"
-        f"{switch_to_answer_prompt}"
-        f"User: {question}\n"
-    )
+        for result in fn_responses:
+            name = result.get("name", "tool") if isinstance(result, dict) else "tool"
+            full_messages.append(tool_message(name, result))
+
+    # Split off the tool results of this turn; what precedes them is what selection saw
+    split = len(full_messages)
+    while split > 0 and full_messages[split - 1]["role"] == "tool":
+        split -= 1
+
+    if ANSWER_CONTINUATION and selection_raw is not None and context.get("selection_chat"):
+        # Continue the exact conversation the selection call sent
+        chat = continue_chat(
+            context["selection_chat"],
+            [{"role": "assistant", "content": selection_raw}] + full_messages[split:],
+            switch_to_answer_prompt,
+        )
+    elif ANSWER_CONTINUATION and selection_raw is not None:
+        turn = (
+            context["select"].fit(full_messages[:split]) +
+            [{"role": "assistant", "content": selection_raw}] +
+            full_messages[split:]
+        )
+        chat = build_chat_messages(turn, context["definitions"] or definitions, switch_to_answer_prompt)
+    else:
+        turn = context["answer"].fit(full_messages)
+        chat = build_chat_messages(turn, context["definitions"] or definitions, switch_to_answer_prompt)
 
     data = {
         "model": MODEL,
-        "prompt": full_prompt,
+        "messages": context["answer"].record(chat),
         "stream": True
     }
+    trace.add("prompt_build", time.perf_counter() - build_start, start=build_start, llm="answer")
 
-    response = requests.post(OLLAMA_URL, headers=HEADERS, data=json.dumps(data), stream=True)
     answer = ""
-    for line in response.iter_lines():
-        if line:
-            chunk = json.loads(line)
-            answer += chunk.get("response", "")
-    return answer
-
-
-def messages_to_chatbot_pairs(messages):
-    """
-    Converts the message history (list of message dicts) to list of (user, assistant) tuples for Gradio Chatbot.
-    Only user/assistant roles are shown; tool/system messages are skipped or shown as "Assistant" comments.
-    """
-    pairs = []
-    last_user = None
-    for msg in messages:
-        if msg["role"] == "user":
-            last_user = msg["content"]
-        elif msg["role"] == "assistant":
-            # Pair it with the last user
-            pairs.append((last_user, msg["content"]))
-            last_user = None
-        # Optionally, you could show tool output as assistant lines too:
-        elif msg["role"] == "tool":
-            # Uncomment to show tool messages as assistant bubbles (optional)
-            pairs.append((None, f'[TOOL:{msg.get("name")}] {msg["content"]}'))
-    return pairs
-
-def ensure_dict_messages(messages):
-    """
-    Converts history from [(user, assistant), ...] tuples (as used by Gradio) 
-    to [{'role': ..., 'content': ...}, ...] dicts for your internal logic.
-    """
-    dict_msgs = []
-    for entry in messages or []:
-        if isinstance(entry, dict):  # Already in new format
-            dict_msgs.append(entry)
-        elif isinstance(entry, (tuple, list)) and len(entry) == 2:
-            user, assistant = entry
-            if user:
-                dict_msgs.append({"role": "user", "content": user})
-            if assistant:
-                dict_msgs.append({"role": "assistant", "content": assistant})
-    return dict_msgs
-
-# Gradio's "history" now stores a list of message dicts, not (user, assistant) tuples!
-def chat_fn(message, messages):
-    messages = ensure_dict_messages(messages)
+    stats = None
+    first_chunk = None
+    requested = time.perf_counter()
+    try:
+        async for chunk in client.astream(data, endpoint="chat"):
+            if first_chunk is None:
+                first_chunk = time.perf_counter()
+            if chunk.get("done"):
+                stats = chunk
+            piece = chunk.get("message", {}).get("content", "")
+            if piece:
+                answer += piece
+                yield answer
+    finally:
+        trace.generation("answer", stats, requested, first_chunk, time.perf_counter())
+
+
+def queue_note(seconds):
+    return f" | Queued {seconds:.2f}s" if seconds >= 0.05 else ""
+
+def select_tokens(turn, context):
+    # A routed or cached turn sent no selection prompt this turn
+    if turn["selection"] != "model":
+        return f"select {turn['selection']}"
+    return f"select ~{context['select'].sent_tokens}"
+
+async def wait_for_slot(ticket, messages):
+    """
+    Waits for the scheduler to grant `ticket`, yielding chatbot updates with the
+    queue position and estimated wait meanwhile (the status bubble is display only).
+    """
+    async for position, wait in scheduler.wait(ticket):
+        status = {"role": "assistant", "content": f"⏳ Waiting for the model: position {position} in queue, about {wait:.0f}s"}
+        yield "", render_transcript(messages) + [status]
+
+# The history lives in the session store (structured messages, tool names included);
+# the chatbot transcript is output only.
+# chat_fn is an async generator so the chatbot updates while the answer streams in
+# and a turn waiting on Ollama or a tool API does not hold a worker thread.
+async def chat_fn(message, session_id=None):
+    session = sessions.get(session_id)
+    context = session.context
+    first_new = len(session.messages)
+    # Spans of this turn; finished (histograms, optional JSONL trace) however the turn ends
+    trace = context["trace"] = Trace(context["session"])
+    # Structured record of the turn, for headless callers (see batch.py)
+    turn = context["turn"] = {
+        "question": message, "outcome": None, "tool_calls": [], "tool_results": [],
+        "deferred": [], "answer": None, "error": None, "selection": None,
+    }
+    try:
+        async for update in run_turn(message, session.messages, context, trace):
+            yield update
+    finally:
+        context.pop("trace", None)
+        trace.finish()
+        turn.update(outcome=trace.tags.get("outcome"), trace=trace.id, timings=trace.stage_totals())
+        if len(session.messages) > first_new:
+            # The turn's timings are kept with its final message
+            session.messages[-1].update(trace=trace.id, timings=turn["timings"])
+        sessions.save(session)
+
+async def run_turn(message, messages, context, trace):
+    turn = context["turn"]
     messages.append({"role": "user", "content": message})
+    yield "", render_transcript(messages)
+
+    chat = selection_prompt(message, messages, context, trace)
+    # Plain-text replies are streamed straight into this bubble
+    reply_msg = None
+    select_queued = 0.0
+    first_token = None
+    # A question matching a declared intent, or a repeated one, is decided
+    # without the model: no selection call and no queue
+    event = routed_function_calls(message, context, chat, trace) if INTENT_ROUTER else None
+    if event is not None:
+        turn["selection"] = "routed"
+    elif SELECTION_CACHE:
+        event = cached_function_calls(message, messages, context, chat, trace)
+        if event is not None:
+            turn["selection"] = "cached"
+    if event is not None:
+        _, raw, fn_calls, error, fn_duration = event
+    else:
+        turn["selection"] = "model"
+        # Selection waits for a slot on the Ollama backend; when the queue is too long, back off
+        queued = time.time()
+        try:
+            ticket = scheduler.admit(context["session"], "select", deadline=context.get("queue_deadline"))
+        except SchedulerBusy as e:
+            trace.tags["outcome"] = "busy"
+            turn["error"] = str(e)
+            messages.append({"role": "assistant", "content": f"⏳ The model is busy right now ({e}). Please try again in a moment."})
+            yield "", render_transcript(messages)
+            return
+
+        speculative = None
+        try:
+            async for update in wait_for_slot(ticket, messages):
+                yield update
+            select_queued = time.time() - queued
+            trace.add("queue", select_queued, llm="select")
+            start = time.time()
+            speculative = start_speculative_answer(chat, context, trace)
+            async for event in stream_function_calls(message, messages, context, chat, speculative):
+                if event[0] == "text":
+                    if speculative is not None:
+                        # Selection has ended; the direct answer streaming now holds its own slot
+                        scheduler.release(ticket)
+                    if reply_msg is None:
+                        first_token = time.time() - start
+                        reply_msg = {"role": "assistant", "content": ""}
+                        messages.append(reply_msg)
+                    reply_msg["content"] = event[1]
+                    yield "", render_transcript(messages)
+                else:
+                    _, raw, fn_calls, error, fn_duration = event
+        finally:
+            scheduler.release(ticket)
+            if speculative is not None:
+                # Stops the direct answer if it was not needed (or the turn was abandoned)
+                speculative.cancel()
 
-    raw, fn_calls, error, fn_duration = extract_function_calls(message, messages)
-    if error:
-        response = f"Error: {error}\nRaw: {raw}\n Took {fn_duration:.2f}s"
-        messages.append({"role": "assistant", "content": response})
-        return "", messages_to_chatbot_pairs(messages)  # Return tuples
+    if error or not fn_calls:
+        trace.tags["outcome"] = "error" if error else "text"
+        turn.update(answer=None if error else raw, error=error)
+        if reply_msg is None:
+            reply_msg = {"role": "assistant", "content": ""}
+            messages.append(reply_msg)
+        if error:
+            reply_msg["content"] = f"Error: {error}\nRaw: {raw}\n Took {fn_duration:.2f}s"
+        else:
+            reply_msg["content"] = raw
+            reply_msg["footer"] = (
+                f"First token: {first_token if first_token is not None else fn_duration:.2f}s"
+                f" | Took {fn_duration:.2f}s{queue_note(select_queued)}"
+                f" | Prompt tokens: {select_tokens(turn, context)}"
+            )
+        yield "", render_transcript(messages)
+        return
 
-    if not fn_calls:
-        response = f"{raw}\n\nTook {fn_duration:.2f}s"
-        messages.append({"role": "assistant", "content": response})
-        return "", messages_to_chatbot_pairs(messages)
+    if reply_msg is not None:
+        # Text before the tool call was only a preamble; the answer replaces it
+        messages.remove(reply_msg)
 
+    trace.tags["outcome"] = "tools"
+    results, deferred = await aexecute_tool_calls(fn_calls, trace)
+    turn.update(tool_calls=fn_calls, deferred=deferred)
     extra_action_note = ""
-    if len(fn_calls) > 1:
+    if deferred:
         extra_action_note = (
-            "\n\n⚠️ Note: You requested multiple actions. "
-            "I will only perform the first one per turn. "
-            "Please specify the next action after this is complete."
+            "\n\n⚠️ Note: These actions were not performed because they were requested together "
+            f"with other calls: {', '.join(describe_call(call) for call in deferred)}. "
+            "Please confirm each one as a separate request."
         )
+    if not results:
+        # Only actions were requested, several at once: nothing runs without confirmation
+        trace.tags["outcome"] = "deferred"
+        turn["answer"] = extra_action_note.strip()
+        messages.append({"role": "assistant", "content": extra_action_note.strip()})
+        yield "", render_transcript(messages)
+        return
 
-    fn_responses = call_function(fn_calls[:1])
-    tool_name = fn_calls[0]["name"] if fn_calls and isinstance(fn_calls[0], dict) and "name" in fn_calls[0] else "tool"
-    tool_content = (
-        json.dumps(fn_responses[0], indent=2) if isinstance(fn_responses[0], dict)
-        else str(fn_responses[0])
-    )
-    tool_msg = {
-        "role": "tool",
-        "name": tool_name,
-        "content": tool_content
-    }
-    messages.append(tool_msg)
+    for call, result in results:
+        messages.append(tool_message(call.get("name", "tool") if isinstance(call, dict) else "tool", result))
+        turn["tool_results"].append({"name": messages[-1]["name"], "content": messages[-1]["content"]})
+    fn_responses = [result for _, result in results]
+    # Show the tool results right away instead of waiting for the answer
+    yield "", render_transcript(messages)
 
+    history = messages.copy()
+    answer_msg = {"role": "assistant", "content": ""}
 
-    start = time.time()
-    final_response = answer_question(message, fn_responses, messages)
-    end = time.time()
-    final_response += (
-        f"\n\nFn call: {fn_duration:.2f}s | Answer: {end - start:.2f}s"
+    queued = time.time()
+    try:
+        ticket = scheduler.admit(context["session"], "answer", deadline=context.get("queue_deadline"))
+    except SchedulerBusy as e:
+        # Degrade: the tool results above stand as the reply
+        trace.tags["outcome"] = "degraded"
+        turn["error"] = str(e)
+        answer_msg["content"] = f"⚠️ The model is busy ({e}); the tool results above are shown as returned.{extra_action_note}"
+        messages.append(answer_msg)
+        yield "", render_transcript(messages)
+        return
+
+    try:
+        async for update in wait_for_slot(ticket, messages):
+            yield update
+        answer_queued = time.time() - queued
+        trace.add("queue", answer_queued, llm="answer")
+        messages.append(answer_msg)
+        start = time.time()
+        first_token = None
+        try:
+            async for partial in answer_question(message, fn_responses, history, selection_raw=raw, context=context):
+                if first_token is None:
+                    first_token = time.time() - start
+                answer_msg["content"] = partial
+                yield "", render_transcript(messages)
+        except httpx.HTTPError as e:
+            turn["error"] = f"Request error: {e}"
+            answer_msg["content"] += f"\n\nError: {e}"
+    finally:
+        scheduler.release(ticket)
+    turn["answer"] = answer_msg["content"]
+    total = time.time() - start
+    if first_token is None:
+        first_token = total
+
+    answer_msg["footer"] = (
+        f"Fn call: {turn['selection'] if turn['selection'] != 'model' else f'{fn_duration:.2f}s'} | First token: {first_token:.2f}s | Answer: {total:.2f}s"
+        f"{queue_note(select_queued + answer_queued)}"
+        f"\nPrompt tokens: {select_tokens(turn, context)} | answer ~{context['answer'].sent_tokens}"
         f"{extra_action_note}"
     )
-    messages.append({"role": "assistant", "content": final_response})
-
-    return "", messages_to_chatbot_pairs(messages)
+    yield "", render_transcript(messages)
 
 with gr.Blocks() as demo:
     gr.Markdown("<h1 style='text-align: center;'>🤖 Chat Assistant</h1>")
+    earlier_button = gr.Button("Load earlier messages", size="sm", visible=False)
     chatbot = gr.Chatbot(height=500, show_label=False)
     user_input = gr.Textbox(placeholder="Ask anything...", show_label=False, lines=1)
-    user_input.submit(chat_fn, [user_input, chatbot], [user_input, chatbot])
+    # Session id per browser session; messages and context windows are kept in the session store
+    session_state = gr.State(lambda: uuid.uuid4().hex)
+    # Messages currently rendered in the chatbot (grows by a page with "Load earlier messages")
+    shown_state = gr.State(TRANSCRIPT_MESSAGES)
+    with gr.Accordion("Tool output", open=True, visible=False) as tool_panel:
+        tool_output = gr.Code(language="json", show_label=False)
+
+    def earlier_update(session_id, shown):
+        hidden = hidden_count(sessions.get(session_id).messages, shown)
+        return gr.update(value=f"Load earlier messages ({hidden} hidden)", visible=hidden > 0)
+
+    def load_earlier(session_id, shown):
+        shown += TRANSCRIPT_MESSAGES
+        return render_transcript(sessions.get(session_id).messages, shown), shown, earlier_update(session_id, shown)
+
+    def after_turn(session_id):
+        return TRANSCRIPT_MESSAGES, earlier_update(session_id, TRANSCRIPT_MESSAGES)
+
+    def show_tool_output(session_id, rendered, evt: gr.SelectData):
+        found = full_tool_output(sessions.get(session_id).messages, rendered, evt.index)
+        if found is None:
+            return gr.skip(), gr.skip()
+        name, output = found
+        return gr.update(label=f"Tool output: {name}", visible=True), output
+
+    user_input.submit(chat_fn, [user_input, session_state], [user_input, chatbot]).then(
+        after_turn, [session_state], [shown_state, earlier_button])
+    earlier_button.click(load_earlier, [session_state, shown_state], [chatbot, shown_state, earlier_button])
+    chatbot.select(show_tool_output, [session_state, chatbot], [tool_panel, tool_output])
+
+demo.queue(default_concurrency_limit=GRADIO_CONCURRENCY)
+
+# Point-in-time values read on each /metrics scrape
+metrics.gauge("agent_scheduler_requests", lambda: {
+    (("state", "active"),): len(scheduler.active),
+    (("state", "waiting"),): len(scheduler.waiting),
+}, help="Ollama requests running and queued in the scheduler")
+metrics.gauge("agent_tool_cache_lookups_total", lambda: {
+    (("tool", name), ("result", result)): stats[result]
+    for name, stats in cache_stats().items() for result in ("hits", "misses", "coalesced")
+}, help="Tool cache lookups by outcome", kind="counter")
+metrics.gauge("agent_selection_cache_lookups_total", lambda: {
+    (("result", result),): selection_cache.stats()[result] for result in ("hits", "misses")
+}, help="Selection cache lookups by outcome", kind="counter")
+metrics.gauge("agent_selection_cache_saved_seconds_total", lambda: {(): selection_cache.stats()["saved_seconds"]},
+              help="Selection time saved by cache hits (average selection duration per hit)", kind="counter")
+metrics.gauge("agent_intent_router_turns_total", lambda: {
+    **{(("result", "routed"), ("tool", name)): count for name, count in intent_router.stats()["by_tool"].items()},
+    (("result", "fallback"), ("tool", "")): intent_router.stats()["fallback"],
+}, help="Turns dispatched by a declared intent without the selection call, and turns left to the model",
+    kind="counter")
+metrics.gauge("agent_speculative_answers_total", lambda: {
+    (("result", result),): count for result, count in speculation_stats.stats().items()
+}, help="Speculative direct answers: started, used as the reply, cancelled for a tool call, failed, "
+        "skipped for lack of a free slot", kind="counter")
+metrics.gauge("agent_sessions", lambda: {(): sessions.stats()["sessions"]},
+              help="Chat sessions held in memory")
+metrics.gauge("agent_rate_limit_tokens", lambda: {
+    (("limit", name), ("bucket", bucket)): tokens
+    for name, stats in rate_limiter.stats().items() for bucket, tokens in stats["tokens"].items()
+}, help="Tokens left in each rate-limit bucket (negative = requests waiting)")
+metrics.gauge("agent_rate_limit_remaining", lambda: {
+    (("limit", name),): stats["remaining"] for name, stats in rate_limiter.stats().items()
+    if stats["remaining"] is not None
+}, help="Last X-RateLimit-Remaining reported by each API endpoint")
+metrics.gauge("agent_rate_limit_blocked_seconds", lambda: {
+    (("limit", name),): stats["blocked_for"] for name, stats in rate_limiter.stats().items()
+}, help="Seconds until a Retry-After block ends")
+metrics.gauge("agent_rate_limit_requests_total", lambda: {
+    (("limit", name), ("result", result)): stats[result]
+    for name, stats in rate_limiter.stats().items() for result in ("requests", "waited", "rejected", "throttled")
+}, help="Outbound tool API requests: sent, delayed for a slot, rejected past the deadline, answered 429",
+    kind="counter")
+metrics.gauge("agent_rate_limit_wait_seconds_total", lambda: {
+    (("limit", name),): stats["wait_seconds"] for name, stats in rate_limiter.stats().items()
+}, help="Time spent waiting for rate-limit slots", kind="counter")
+
+if __name__ == "__main__":
+    if METRICS_PORT:
+        start_metrics_server(METRICS_PORT)
+    try:
+        client.preload(MODEL)
+    except requests.RequestException as e:
+        console.print(f"[bold yellow]Could not preload {MODEL}:[/bold yellow] {e}")
 
-demo.launch()
+    demo.launch()
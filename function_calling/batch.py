@@ -0,0 +1,133 @@
+"""
+Headless batch mode: runs questions or scripted conversations from a JSONL
+file through the same pipeline as the chat UI, several at a time, and
+appends one JSON result per item to the output file as items complete.
+
+Input lines are {"id": ..., "question": "..."} or {"id": ..., "conversation": ["...", "..."]}
+(a bare JSON string is a single question; the line number is used when there is no id).
+Re-running with the same output file resumes: items already written are skipped
+(with --retry-errors, failed items run again and their new line supersedes the old one).
+
+    python batch.py questions.jsonl results.jsonl --concurrency 8
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+from rich.console import Console
+
+console = Console()
+
+BATCH_CONCURRENCY = int(os.environ.get("BATCH_CONCURRENCY", "4"))
+
+
+def read_items(path):
+    """
+    Yields (id, list of questions) for each non-empty input line.
+    """
+    with open(path) as f:
+        for number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            item = json.loads(line)
+            if isinstance(item, str):
+                item = {"question": item}
+            questions = item.get("conversation") or [item["question"]]
+            yield str(item.get("id", number)), questions
+
+
+def completed_ids(path, retry_errors=False):
+    """
+    Ids already written to the output file (a truncated last line from an
+    interrupted run is ignored, so that item is run again).
+    """
+    done = set()
+    if not os.path.exists(path):
+        return done
+    with open(path) as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if retry_errors and record.get("status") != "ok":
+                continue
+            done.add(str(record.get("id")))
+    return done
+
+
+async def run_item(app, item_id, questions):
+    """
+    Runs one conversation turn by turn through chat_fn with its own session.
+    """
+    session = app.sessions.get()
+    # Batch work waits for the model however long the queue is
+    session.context["queue_deadline"] = float("inf")
+    turns = []
+    start = time.perf_counter()
+    for question in questions:
+        turn_start = time.perf_counter()
+        async for _ in app.chat_fn(question, session.id):
+            pass
+        turn = dict(session.context["turn"])
+        turn["duration"] = round(time.perf_counter() - turn_start, 3)
+        turns.append(turn)
+        if turn["error"]:
+            break
+    status = "error" if any(turn["error"] for turn in turns) else "ok"
+    return {"id": item_id, "status": status, "duration": round(time.perf_counter() - start, 3), "turns": turns}
+
+
+async def run_batch(input_path, output_path, concurrency=BATCH_CONCURRENCY, retry_errors=False):
+    import Qwen_fc_app as app
+
+    done = completed_ids(output_path, retry_errors)
+    pending = [(item_id, questions) for item_id, questions in read_items(input_path) if item_id not in done]
+    if done:
+        console.print(f"Resuming: {len(done)} items already in {output_path}, {len(pending)} to run")
+    queue = asyncio.Queue()
+    for entry in pending:
+        queue.put_nowait(entry)
+    finished = 0
+
+    with open(output_path, "a+") as out:
+        if out.tell():
+            out.seek(out.tell() - 1)
+            if out.read(1) != "\n":
+                # Terminate the partial line an interrupted run left behind
+                out.write("\n")
+
+        async def worker():
+            nonlocal finished
+            while not queue.empty():
+                item_id, questions = queue.get_nowait()
+                try:
+                    record = await run_item(app, item_id, questions)
+                except Exception as e:
+                    record = {"id": item_id, "status": "error", "error": f"{type(e).__name__}: {e}", "turns": []}
+                # One complete line per item, flushed right away, so an interrupted run can resume
+                out.write(json.dumps(record, default=str) + "\n")
+                out.flush()
+                finished += 1
+                color = "green" if record["status"] == "ok" else "red"
+                console.print(f"[{finished}/{len(pending)}] {item_id} [{color}]{record['status']}[/{color}] "
+                              f"{record.get('duration', 0):.1f}s")
+
+        await asyncio.gather(*(worker() for _ in range(max(concurrency, 1))))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run JSONL questions or conversations through the agent.")
+    parser.add_argument("input", help="JSONL file of questions or conversations")
+    parser.add_argument("output", help="JSONL results file (appended to; existing items are skipped)")
+    parser.add_argument("--concurrency", type=int, default=BATCH_CONCURRENCY, help="items run at the same time")
+    parser.add_argument("--retry-errors", action="store_true", help="run items whose earlier result was an error again")
+    args = parser.parse_args()
+    try:
+        asyncio.run(run_batch(args.input, args.output, args.concurrency, args.retry_errors))
+    except KeyboardInterrupt:
+        console.print("[yellow]Interrupted; run the same command again to resume.[/yellow]")
+        sys.exit(130)
@@ -0,0 +1,127 @@
+import os
+import uuid
+from projection import estimate_tokens
+
+# History budgets (tokens) per stage, excluding the static system message
+SELECT_HISTORY_TOKENS = int(os.environ.get("SELECT_HISTORY_TOKENS", "2000"))
+ANSWER_HISTORY_TOKENS = int(os.environ.get("ANSWER_HISTORY_TOKENS", "3000"))
+SUMMARY_MAX_TOKENS = int(os.environ.get("SUMMARY_MAX_TOKENS", "300"))
+# When the window overflows, evict down to this fraction of the budget so the
+# window start (and the prompt prefix) only moves every few turns
+EVICT_TO = 0.6
+# Answered tool outputs keep only this many characters
+ELIDED_TOOL_CHARS = 200
+SUMMARY_LINE_CHARS = 160
+MESSAGE_OVERHEAD_TOKENS = 4
+
+
+def message_tokens(msg):
+    return estimate_tokens(msg["content"]) + MESSAGE_OVERHEAD_TOKENS
+
+
+def chat_tokens(chat):
+    """
+    Estimated prompt tokens of a list of /api/chat messages.
+    """
+    return sum(message_tokens(msg) for msg in chat)
+
+
+def elide_answered_tools(messages):
+    """
+    Tool outputs followed by an assistant reply have already been answered;
+    only their head is kept. Returns new dicts, the history is not modified.
+    """
+    answered = False
+    elided = []
+    for msg in reversed(messages):
+        if msg["role"] == "assistant":
+            answered = True
+        elif msg["role"] == "tool" and answered and len(msg["content"]) > ELIDED_TOOL_CHARS:
+            msg = {**msg, "content": f'{msg["content"][:ELIDED_TOOL_CHARS]}…[elided, already answered]'}
+        elided.append(msg)
+    elided.reverse()
+    return elided
+
+
+def summary_line(msg):
+    text = " ".join(msg["content"].split())
+    if len(text) > SUMMARY_LINE_CHARS:
+        text = text[:SUMMARY_LINE_CHARS] + "…"
+    label = f'tool {msg.get("name", "")}'.strip() if msg["role"] == "tool" else msg["role"]
+    return f"- {label}: {text}"
+
+
+class ContextWindow:
+    """
+    Fits the conversation into a token budget for one stage.
+    The newest messages are kept; older ones are evicted into a rolling
+    summary that is extended incrementally (each evicted message is digested
+    once) instead of being recomputed every turn.
+    """
+
+    def __init__(self, budget_tokens, summary_tokens=SUMMARY_MAX_TOKENS):
+        self.budget_tokens = budget_tokens
+        self.summary_tokens = summary_tokens
+        self.start = 0           # index of the first message kept verbatim
+        self.summary_lines = []
+        self.sent_tokens = 0     # estimated tokens of the last prompt built for this stage
+
+    def fit(self, messages):
+        """
+        Returns the messages to send: an optional summary message followed by
+        the newest messages that fit the budget.
+        """
+        if self.start > len(messages):
+            # History is shorter than what we summarized (new or edited session)
+            self.start = 0
+            self.summary_lines = []
+        messages = elide_answered_tools(messages)
+
+        window = messages[self.start:]
+        if sum(message_tokens(msg) for msg in window) > self.budget_tokens:
+            target = self.budget_tokens * EVICT_TO
+            # Walk back from the newest message; the latest one is always kept
+            kept = message_tokens(messages[-1])
+            start = len(messages) - 1
+            while start > self.start and kept + message_tokens(messages[start - 1]) <= target:
+                start -= 1
+                kept += message_tokens(messages[start])
+            self._summarize(messages[self.start:start])
+            self.start = start
+            window = messages[self.start:]
+
+        if not self.summary_lines:
+            return window
+        summary = {
+            "role": "system",
+            "content": "Summary of earlier conversation:\n" + "\n".join(self.summary_lines),
+        }
+        return [summary] + window
+
+    def _summarize(self, evicted):
+        self.summary_lines.extend(summary_line(msg) for msg in evicted)
+        while (len(self.summary_lines) > 1 and
+               estimate_tokens("\n".join(self.summary_lines)) > self.summary_tokens):
+            self.summary_lines.pop(0)
+
+    def record(self, chat):
+        """
+        Records the size of the prompt actually sent for this stage.
+        """
+        self.sent_tokens = chat_tokens(chat)
+        return chat
+
+
+def new_context(session=None):
+    """
+    Per-session context state: a session id, one window per stage, plus the tool
+    definitions and the exact chat the selection stage sent (reused by the
+    answer stage).
+    """
+    return {
+        "session": session or uuid.uuid4().hex,
+        "select": ContextWindow(SELECT_HISTORY_TOKENS),
+        "answer": ContextWindow(ANSWER_HISTORY_TOKENS),
+        "definitions": None,
+        "selection_chat": None,
+    }
@@ -0,0 +1,110 @@
+import os
+import time
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from registry import registry, side_effecting_tools
+from tool_cache import clear_outcome, last_outcome, is_cacheable
+from rate_limit import RateLimited
+
+TOOL_WORKERS = int(os.environ.get("TOOL_WORKERS", "8"))
+
+_pool = ThreadPoolExecutor(max_workers=TOOL_WORKERS, thread_name_prefix="tool")
+
+
+def tool_error(e):
+    """
+    Result returned to the model for a tool call that raised.
+    """
+    if isinstance(e, RateLimited):
+        return e.result()
+    return {"status": "error", "error": f"{type(e).__name__}: {e}"}
+
+
+def record_tool_span(trace, call, start, result, cache):
+    if trace is None:
+        return
+    name = call.get("name") if isinstance(call, dict) else None
+    trace.add(
+        "tool", time.perf_counter() - start, start=start,
+        # The name comes from the model: a hallucinated one must not become a metric label
+        tool=name if name in registry.functions else "unknown",
+        cache=cache or "none",
+        # Results that may not be cached are the error results
+        status="ok" if is_cacheable(result) else "error",
+    )
+
+
+def run_tool(call, trace=None):
+    """
+    Runs a single tool call. Invalid calls are rejected by the registry before
+    dispatch; errors are returned as a result so one failing call does not
+    discard the results of the others. With a telemetry trace, a "tool" span
+    tagged with the tool name and cache outcome is recorded.
+    """
+    start = time.perf_counter()
+    clear_outcome()
+    try:
+        result = registry.call(call)
+    except Exception as e:
+        result = tool_error(e)
+    record_tool_span(trace, call, start, result, last_outcome())
+    return result
+
+
+async def arun_tool(call, trace=None):
+    """
+    Async form of run_tool: async tools are awaited, sync tools (and their
+    thread-based cache) run on the tool pool.
+    """
+    if not (isinstance(call, dict) and call.get("name") in registry.coroutines):
+        return await asyncio.get_running_loop().run_in_executor(_pool, run_tool, call, trace)
+    start = time.perf_counter()
+    try:
+        result = await registry.acall(call)
+    except Exception as e:
+        result = tool_error(e)
+    record_tool_span(trace, call, start, result, None)
+    return result
+
+
+def split_calls(function_calls):
+    """
+    Returns (read-only calls, side-effecting calls to run, deferred calls).
+    A side-effecting call only runs when it is the turn's only call. Next to
+    other calls it was written before their results existed, so every
+    side-effecting call is deferred and goes back through the confirmation flow.
+    """
+    read_only = []
+    side_effecting = []
+    for call in function_calls:
+        if isinstance(call, dict) and call.get("name") in side_effecting_tools:
+            side_effecting.append(call)
+        else:
+            read_only.append(call)
+    if len(function_calls) == 1:
+        return read_only, side_effecting, []
+    return read_only, [], side_effecting
+
+
+async def aexecute_tool_calls(function_calls, trace=None):
+    """
+    Executes the tool calls of one turn.
+    Read-only calls are independent and gathered concurrently (async tools on
+    the event loop, sync ones on the tool pool), so the turn costs roughly the
+    latency of the slowest call. A side-effecting call (tool registered with
+    side_effects=True) runs only when it is the only call; next to other calls,
+    side-effecting calls are returned as deferred (see split_calls).
+
+    Returns (results, deferred): results is a list of (call, result) in call order.
+    """
+    read_only, to_run, deferred = split_calls(function_calls)
+
+    results = {}
+    outputs = await asyncio.gather(*(arun_tool(call, trace) for call in read_only))
+    for call, result in zip(read_only, outputs):
+        results[id(call)] = result
+    for call in to_run:
+        results[id(call)] = await arun_tool(call, trace)
+
+    ordered = [(call, results[id(call)]) for call in function_calls if id(call) in results]
+    return ordered, deferred
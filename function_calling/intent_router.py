@@ -0,0 +1,129 @@
+import os
+import re
+import ipaddress
+import threading
+from registry import registry
+
+# Dispatch unambiguous requests (declared intents) without the LLM selection call (0 disables)
+INTENT_ROUTER = os.environ.get("INTENT_ROUTER", "1") == "1"
+
+# A word of a place name; a conjunction means several requests ("London and Paris"), left to the model
+PLACE_WORD = r"(?!(?:and|or|then|but|also)\b)[^\W\d_][\w.'-]*"
+# Slot kinds usable in intent patterns as {argument:kind}
+SLOT_PATTERNS = {
+    "ip": r"[0-9A-Fa-f:.]{2,45}",
+    "cidr": r"[0-9A-Fa-f:.]{2,45}/\d{1,3}",
+    # A place name: letters first, a few words at most (lazy, so "tomorrow" etc. stay with the pattern)
+    "place": rf"{PLACE_WORD}(?: {PLACE_WORD}){{0,3}}?",
+    "text": r".+?",
+}
+# Words a place never contains: function words, pronouns and words that qualify
+# the request ("forecast for it", "weather in general", "rain in the morning");
+# such questions depend on context or are not about a place, so the model decides
+NON_PLACE_WORDS = {
+    "a", "an", "the", "of", "in", "on", "at", "to", "for", "from", "with", "about", "by", "near",
+    "is", "are", "was", "be", "do", "does", "what", "how", "who", "where", "when", "which", "please",
+    "i", "me", "my", "mine", "myself", "you", "your", "we", "us", "our", "he", "him", "his", "she",
+    "her", "they", "them", "their", "it", "its", "this", "that", "these", "those", "here", "there",
+    "someone", "somebody", "anyone", "everyone", "everybody", "same", "other", "again", "too", "also",
+    "general", "brief", "detail", "details", "celsius", "fahrenheit", "metric", "imperial",
+    "now", "today", "tonight", "tomorrow", "yesterday", "week", "weekend", "currently",
+    "morning", "afternoon", "evening", "night",
+}
+SLOT_RE = re.compile(r"\{(\w+):(\w+)\}")
+# Trailing punctuation ignored when matching ("is 1.2.3.4 abused?")
+TRAILING_PUNCTUATION = "?!.,; "
+
+
+def _valid(kind, value):
+    try:
+        if kind == "ip":
+            ipaddress.ip_address(value)
+        elif kind == "cidr":
+            ipaddress.ip_network(value, strict=False)
+        elif kind == "place":
+            return not any(word.casefold() in NON_PLACE_WORDS for word in value.split())
+    except ValueError:
+        return False
+    return True
+
+
+class Intent:
+    """
+    A request pattern declared with a tool (register_tool(..., intents=[...])).
+    The pattern must match the whole question (case-insensitive, whitespace
+    collapsed, trailing punctuation ignored); {argument:kind} slots capture
+    argument values (kinds: ip, cidr, place, text) and `arguments` adds fixed ones.
+
+        Intent("has {ip_address:ip} been (abused|reported)")
+    """
+
+    def __init__(self, pattern, **arguments):
+        self.pattern = pattern
+        self.arguments = arguments
+        self.kinds = dict(SLOT_RE.findall(pattern))
+        regex = SLOT_RE.sub(lambda m: f"(?P<{m.group(1)}>{SLOT_PATTERNS[m.group(2)]})", pattern)
+        self._regex = re.compile(regex.replace(" ", r"\s+"), re.IGNORECASE)
+
+    def match(self, question):
+        """
+        The arguments for the question, or None if the pattern does not match.
+        """
+        m = self._regex.fullmatch(question)
+        if m is None:
+            return None
+        captured = {name: value for name, value in m.groupdict().items() if value is not None}
+        if not all(_valid(self.kinds[name], value) for name, value in captured.items()):
+            return None
+        return {**self.arguments, **captured}
+
+
+class IntentRouter:
+    """
+    Rule-based fast path in front of the LLM selection call. A question is
+    routed only when the intents of exactly one tool match it and the
+    arguments validate; anything else falls back to the model.
+    """
+
+    def __init__(self):
+        self.routed = {}      # tool name -> turns dispatched directly
+        self.fallback = 0
+        self._lock = threading.Lock()
+
+    def route(self, question):
+        """
+        Tool calls for the question, or None to let the model decide.
+        """
+        text = " ".join(question.split()).rstrip(TRAILING_PUNCTUATION)
+        matches = {}
+        for name, intents in registry.intents.items():
+            for intent in intents:
+                arguments = intent.match(text)
+                if arguments is not None:
+                    matches.setdefault(name, arguments)
+                    break
+        call = None
+        if len(matches) == 1:
+            name, arguments = next(iter(matches.items()))
+            _, arguments, error = registry.validate({"name": name, "arguments": arguments})
+            if error is None:
+                call = {"name": name, "arguments": arguments}
+        with self._lock:
+            if call is None:
+                self.fallback += 1
+                return None
+            self.routed[call["name"]] = self.routed.get(call["name"], 0) + 1
+        return [call]
+
+    def stats(self):
+        with self._lock:
+            routed = sum(self.routed.values())
+            return {
+                "routed": routed,
+                "fallback": self.fallback,
+                "routed_rate": routed / (routed + self.fallback) if routed + self.fallback else 0.0,
+                "by_tool": dict(self.routed),
+            }
+
+
+intent_router = IntentRouter()
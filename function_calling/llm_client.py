@@ -0,0 +1,155 @@
+import os
+import json
+import asyncio
+import requests
+import httpx
+from requests.adapters import HTTPAdapter
+from dotenv import load_dotenv
+
+load_dotenv()
+
+OLLAMA_HOST = os.environ.get("OLLAMA_HOST", "http://localhost:11434")
+# How long Ollama keeps the model loaded after a request (e.g. "30m", "-1" = forever)
+OLLAMA_KEEP_ALIVE = os.environ.get("OLLAMA_KEEP_ALIVE", "30m")
+CONNECT_TIMEOUT = float(os.environ.get("OLLAMA_CONNECT_TIMEOUT", "5"))
+READ_TIMEOUT = float(os.environ.get("OLLAMA_READ_TIMEOUT", "300"))
+POOL_SIZE = int(os.environ.get("OLLAMA_POOL_SIZE", "16"))
+
+HEADERS = {"Content-Type": "application/json"}
+
+
+class OllamaClient:
+    """
+    Shared client for the Ollama HTTP API.
+    Keeps a pool of keep-alive connections (sync and async) instead of opening a
+    new TCP connection per call, applies connect/read timeouts and sends
+    `keep_alive` with every request so the model stays resident between turns.
+    """
+
+    def __init__(self, host=OLLAMA_HOST, keep_alive=OLLAMA_KEEP_ALIVE,
+                 connect_timeout=CONNECT_TIMEOUT, read_timeout=READ_TIMEOUT,
+                 pool_size=POOL_SIZE):
+        self.host = host.rstrip("/")
+        self.keep_alive = keep_alive
+        self.timeout = (connect_timeout, read_timeout)
+        self.pool_size = pool_size
+
+        self.session = requests.Session()
+        self.session.headers.update(HEADERS)
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self._async_clients = {}   # event loop -> (httpx client, its shutdown closer, closer task)
+
+    def url(self, endpoint):
+        return f"{self.host}/api/{endpoint}"
+
+    def _payload(self, data):
+        if self.keep_alive is not None and "keep_alive" not in data:
+            data = {**data, "keep_alive": self.keep_alive}
+        return json.dumps(data)
+
+    # --- sync interface ---
+
+    def generate(self, data, endpoint="generate"):
+        """
+        Non-streaming call. Returns the `requests.Response`; callers check the status code.
+        """
+        data = {**data, "stream": False}
+        return self.session.post(self.url(endpoint), data=self._payload(data), timeout=self.timeout)
+
+    def stream(self, data, endpoint="generate"):
+        """
+        Streaming call. Yields each NDJSON chunk as a dict.
+        Closing the generator early closes the HTTP response (and stops the generation).
+        """
+        data = {**data, "stream": True}
+        response = self.session.post(
+            self.url(endpoint), data=self._payload(data), timeout=self.timeout, stream=True
+        )
+        try:
+            response.raise_for_status()
+            for line in response.iter_lines():
+                if line:
+                    yield json.loads(line)
+        finally:
+            response.close()
+
+    def preload(self, model):
+        """
+        Load the model into memory ahead of the first user turn.
+        """
+        return self.generate({"model": model})
+
+    # --- async interface ---
+
+    @property
+    def async_client(self):
+        """
+        httpx client of the running event loop. Connections cannot be shared
+        across loops, so each loop gets its own client, closed when that loop
+        shuts down (see _close_on_shutdown).
+        """
+        loop = asyncio.get_running_loop()
+        entry = self._async_clients.get(loop)
+        if entry is None:
+            async_client = httpx.AsyncClient(
+                headers=HEADERS,
+                timeout=httpx.Timeout(self.timeout[1], connect=self.timeout[0]),
+                limits=httpx.Limits(
+                    max_connections=self.pool_size,
+                    max_keepalive_connections=self.pool_size,
+                ),
+            )
+            closer = self._close_on_shutdown(loop, async_client)
+            # Runs the closer up to its yield, which registers it with the loop
+            entry = (async_client, closer, loop.create_task(closer.__anext__()))
+            self._async_clients[loop] = entry
+        return entry[0]
+
+    async def _close_on_shutdown(self, loop, async_client):
+        """
+        Async generator parked at its yield for the lifetime of the loop. The
+        loop closes open async generators when it shuts down (asyncio.run does
+        so before closing the loop), which closes the client's pool while its
+        connections can still be shut down cleanly.
+        """
+        try:
+            yield
+        finally:
+            self._async_clients.pop(loop, None)
+            await async_client.aclose()
+
+    async def agenerate(self, data, endpoint="generate"):
+        """
+        Async form of generate. Returns the `httpx.Response`.
+        """
+        data = {**data, "stream": False}
+        return await self.async_client.post(self.url(endpoint), content=self._payload(data))
+
+    async def astream(self, data, endpoint="generate"):
+        """
+        Async form of stream; `aclose()` on the generator stops the generation.
+        """
+        data = {**data, "stream": True}
+        async with self.async_client.stream(
+            "POST", self.url(endpoint), content=self._payload(data)
+        ) as response:
+            response.raise_for_status()
+            async for line in response.aiter_lines():
+                if line:
+                    yield json.loads(line)
+
+    async def aclose(self):
+        """
+        Closes the running loop's client now instead of at loop shutdown.
+        """
+        entry = self._async_clients.get(asyncio.get_running_loop())
+        if entry is not None:
+            await entry[1].aclose()
+
+    def close(self):
+        self.session.close()
+
+
+client = OllamaClient()
@@ -0,0 +1,175 @@
+import os
+import time
+import asyncio
+import itertools
+
+# Generations sent to Ollama at the same time (match OLLAMA_NUM_PARALLEL)
+SCHEDULER_CONCURRENCY = int(os.environ.get("SCHEDULER_CONCURRENCY", "4"))
+# Requests whose estimated wait exceeds this many seconds are not queued
+SCHEDULER_DEADLINE = float(os.environ.get("SCHEDULER_DEADLINE", "30"))
+# Answer requests waiting longer than this are served like selection requests
+SCHEDULER_AGING = float(os.environ.get("SCHEDULER_AGING", "10"))
+# How often a waiting request reports its queue position
+STATUS_INTERVAL = 1.0
+# Short selection calls go before long answer generations
+STAGE_PRIORITY = {"select": 0, "answer": 1, "speculative": 2}
+# Starting estimates of how long a stage holds a slot (seconds), refined as calls finish
+INITIAL_SERVICE_TIME = {"select": 2.0, "answer": 8.0, "speculative": 8.0}
+EMA_ALPHA = 0.2
+
+
+class SchedulerBusy(Exception):
+    """
+    Raised by admit when the estimated wait exceeds the deadline.
+    """
+
+    def __init__(self, wait, deadline):
+        super().__init__(f"estimated wait {wait:.0f}s exceeds {deadline:.0f}s")
+        self.wait = wait
+        self.deadline = deadline
+
+
+class Ticket:
+    def __init__(self, session, stage, tag, seq, granted):
+        self.session = session
+        self.stage = stage
+        self.tag = tag
+        self.seq = seq
+        self.granted = granted    # future resolved when the request gets a slot
+        self.enqueued_at = time.monotonic()
+        self.started_at = None
+
+
+class LLMScheduler:
+    """
+    Admission control in front of the Ollama backend.
+    At most `concurrency` generations run at once. Waiting requests are ordered
+    by stage priority (aged answers are promoted) and then by a start-time fair
+    queueing tag: each request of a session is tagged after that session's
+    previous one, so a session issuing many requests cannot starve the others.
+    Service times per stage are tracked to estimate waits; requests that would
+    wait past the deadline are rejected at admission (backpressure).
+    Must be used from a single event loop.
+    """
+
+    def __init__(self, concurrency=SCHEDULER_CONCURRENCY, deadline=SCHEDULER_DEADLINE, aging=SCHEDULER_AGING):
+        self.concurrency = concurrency
+        self.deadline = deadline
+        self.aging = aging
+        self.waiting = []
+        self.active = set()
+        self.service_time = dict(INITIAL_SERVICE_TIME)
+        self.admitted = 0
+        self.rejected = 0
+        self._virtual = 0
+        self._session_tags = {}
+        self._seq = itertools.count()
+
+    def _key(self, ticket, now):
+        priority = STAGE_PRIORITY.get(ticket.stage, 1)
+        if now - ticket.enqueued_at > self.aging:
+            priority = 0
+        return priority, ticket.tag, ticket.seq
+
+    def admit(self, session, stage, deadline=None):
+        """
+        Queues a request for a generation slot and returns its Ticket.
+        Raises SchedulerBusy instead when the estimated wait exceeds the deadline
+        (the scheduler's default when None; float("inf") always queues).
+        """
+        tag = max(self._virtual, self._session_tags.get(session, 0)) + 1
+        ticket = Ticket(session, stage, tag, next(self._seq), asyncio.get_running_loop().create_future())
+        wait = self.estimate(ticket)
+        deadline = self.deadline if deadline is None else deadline
+        if wait > deadline:
+            self.rejected += 1
+            raise SchedulerBusy(wait, deadline)
+        self._session_tags[session] = tag
+        self.waiting.append(ticket)
+        self.admitted += 1
+        self._dispatch()
+        return ticket
+
+    def try_admit(self, session, stage):
+        """
+        Admits a request only if it can start right away (nothing queued and a
+        slot free) and returns its granted Ticket, else None. For optional
+        work, such as speculative answers, that must not delay anyone.
+        """
+        if self.waiting or len(self.active) >= self.concurrency:
+            return None
+        return self.admit(session, stage, deadline=float("inf"))
+
+    def position(self, ticket):
+        """
+        1-based place of a waiting ticket in the queue (0 once it runs).
+        """
+        if ticket not in self.waiting:
+            return 0
+        now = time.monotonic()
+        key = self._key(ticket, now)
+        return 1 + sum(1 for other in self.waiting if self._key(other, now) < key)
+
+    def estimate(self, ticket):
+        """
+        Estimated seconds until the ticket gets a slot: the work queued ahead of
+        it plus what is left of the running generations, spread over the slots.
+        """
+        now = time.monotonic()
+        key = self._key(ticket, now)
+        ahead = [other for other in self.waiting if other is not ticket and self._key(other, now) < key]
+        if not ahead and len(self.active) < self.concurrency:
+            return 0.0
+        work = sum(self.service_time[other.stage] for other in ahead)
+        work += sum(max(self.service_time[t.stage] - (now - t.started_at), 0.0) for t in self.active)
+        return work / self.concurrency
+
+    async def wait(self, ticket):
+        """
+        Waits for the ticket's slot, yielding (position, estimated wait)
+        every STATUS_INTERVAL seconds while it is queued.
+        """
+        while not ticket.granted.done():
+            yield self.position(ticket), self.estimate(ticket)
+            try:
+                await asyncio.wait_for(asyncio.shield(ticket.granted), STATUS_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+
+    def release(self, ticket):
+        """
+        Frees the ticket's slot (or drops it from the queue if it never ran).
+        """
+        if ticket in self.waiting:
+            self.waiting.remove(ticket)
+        elif ticket in self.active:
+            self.active.discard(ticket)
+            elapsed = time.monotonic() - ticket.started_at
+            self.service_time[ticket.stage] += EMA_ALPHA * (elapsed - self.service_time[ticket.stage])
+        if not any(t.session == ticket.session for t in self.waiting) and \
+                not any(t.session == ticket.session for t in self.active):
+            self._session_tags.pop(ticket.session, None)
+        self._dispatch()
+
+    def _dispatch(self):
+        while self.waiting and len(self.active) < self.concurrency:
+            now = time.monotonic()
+            ticket = min(self.waiting, key=lambda t: self._key(t, now))
+            self.waiting.remove(ticket)
+            ticket.started_at = now
+            self.active.add(ticket)
+            self._virtual = max(self._virtual, ticket.tag)
+            if not ticket.granted.done():
+                ticket.granted.set_result(True)
+
+    def stats(self):
+        return {
+            "active": len(self.active),
+            "waiting": len(self.waiting),
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "service_time": dict(self.service_time),
+        }
+
+
+scheduler = LLMScheduler()
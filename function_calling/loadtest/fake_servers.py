@@ -0,0 +1,364 @@
+import json
+import time
+import random
+import hashlib
+import threading
+from collections import Counter
+from urllib.parse import urlparse, parse_qs
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+CHARS_PER_TOKEN = 4
+ANSWER_WORDS = (
+    "Based on the tool result the requested information is shown above and "
+    "nothing unusual stands out let me know if you want to notify the team"
+).split()
+
+
+def stable_int(text, modulo):
+    """
+    Deterministic pseudo-random number for a value (same IP -> same score).
+    """
+    return int(hashlib.sha1(str(text).encode()).hexdigest()[:8], 16) % modulo
+
+
+def common_prefix_length(a, b):
+    # Binary search on slice equality (compared in C) instead of a per-character loop
+    low, high = 0, min(len(a), len(b))
+    while low < high:
+        mid = (low + high + 1) // 2
+        if a[:mid] == b[:mid]:
+            low = mid
+        else:
+            high = mid - 1
+    return low
+
+
+def answer_text(tokens):
+    return " ".join(ANSWER_WORDS[i % len(ANSWER_WORDS)] for i in range(tokens)) + "."
+
+
+class FakeServer:
+    """
+    Threaded local HTTP server; subclasses implement handle(method, path, query, body).
+    """
+
+    def __init__(self, port=0):
+        owner = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                owner._dispatch(self, "GET")
+
+            def do_POST(self):
+                owner._dispatch(self, "POST")
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+        self.server.daemon_threads = True
+        self.requests = Counter()
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server.server_port}"
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def _dispatch(self, handler, method):
+        length = int(handler.headers.get("Content-Length", 0))
+        raw = handler.rfile.read(length) if length else b""
+        try:
+            body = json.loads(raw) if raw else {}
+        except ValueError:
+            body = {}
+        parsed = urlparse(handler.path)
+        query = {k: v[0] for k, v in parse_qs(parsed.query).items()}
+        self.requests[parsed.path] += 1
+        try:
+            self.handle(handler, method, parsed.path, query, body)
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # the client stopped reading (e.g. early-stopped stream)
+
+    @staticmethod
+    def send_json(handler, status, data, headers=None):
+        payload = json.dumps(data).encode()
+        handler.send_response(status)
+        handler.send_header("Content-Type", "application/json")
+        handler.send_header("Content-Length", str(len(payload)))
+        for name, value in (headers or {}).items():
+            handler.send_header(name, str(value))
+        handler.end_headers()
+        handler.wfile.write(payload)
+
+
+class FakeOllama(FakeServer):
+    """
+    Stand-in for Ollama's /api/generate and /api/chat.
+    Prefill takes prompt tokens / prefill_tokens_per_sec (only for the part of the
+    prompt not shared with a recent one, like Ollama's prompt cache); output is
+    streamed as NDJSON at tokens_per_sec, with at most `parallel` generations
+    running at once (OLLAMA_NUM_PARALLEL). Outputs are scripted per question in
+    `scripts`: {question: {"tool_calls": [...] or None, "answer_tokens": n}}.
+    """
+
+    def __init__(self, prefill_tokens_per_sec=2000, tokens_per_sec=40, parallel=4, prompt_cache=True, port=0):
+        self.prefill_rate = prefill_tokens_per_sec
+        self.token_rate = tokens_per_sec
+        self.prompt_cache = prompt_cache
+        self.scripts = {}
+        self.slots = threading.BoundedSemaphore(parallel)
+        self.recent_prompts = []
+        self._lock = threading.Lock()
+        super().__init__(port)
+
+    def _uncached_tokens(self, prompt):
+        with self._lock:
+            shared = 0
+            if self.prompt_cache:
+                shared = max((common_prefix_length(previous, prompt) for previous in self.recent_prompts), default=0)
+            self.recent_prompts = ([prompt] + self.recent_prompts)[:32]
+        return max(len(prompt) - shared, 0) // CHARS_PER_TOKEN + 1
+
+    def _script(self, body):
+        """
+        Returns (stage, script) for a request: "answer" once a tool result follows
+        the last user message (or tool calls are ruled out), otherwise "select".
+        """
+        if "messages" in body:
+            messages = body["messages"]
+            last_user = max((i for i, m in enumerate(messages) if m.get("role") == "user"), default=-1)
+            question = messages[last_user]["content"] if last_user >= 0 else ""
+            answered = any(m.get("role") == "tool" for m in messages[last_user + 1:])
+            if messages[-1].get("role") == "system" and "Do NOT output any TOOL_CALLS" in messages[-1]["content"]:
+                # Told not to call tools: a speculative direct answer
+                answered = True
+            return ("answer" if answered else "select"), self.scripts.get(question, {})
+        prompt = body.get("prompt", "")
+        found = max(self.scripts, key=prompt.rfind, default=None)
+        if found is None or prompt.rfind(found) == -1:
+            return "answer", {}
+        return ("answer" if "Tool [" in prompt[prompt.rfind(found):] else "select"), self.scripts[found]
+
+    def _output(self, body):
+        stage, script = self._script(body)
+        calls = script.get("tool_calls")
+        answer = answer_text(script.get("answer_tokens", 40))
+        if stage == "select" and calls:
+            if body.get("format"):
+                return json.dumps({"tool_calls": calls, "answer": ""})
+            return "[TOOL_CALLS] " + json.dumps(calls)
+        if stage == "select" and body.get("format"):
+            return json.dumps({"tool_calls": [], "answer": answer})
+        return answer
+
+    def handle(self, handler, method, path, query, body):
+        chat = path.endswith("/chat")
+        if not body.get("messages") and not body.get("prompt"):
+            # Model preload
+            self.send_json(handler, 200, {"model": body.get("model"), "done": True})
+            return
+
+        prompt = json.dumps(body.get("messages") if chat else body.get("prompt"))
+        text = self._output(body)
+        pieces = [text[i:i + CHARS_PER_TOKEN] for i in range(0, len(text), CHARS_PER_TOKEN)]
+
+        def chunk(piece, done, stats=None):
+            data = {"model": body.get("model"), "done": done}
+            if chat:
+                data["message"] = {"role": "assistant", "content": piece}
+            else:
+                data["response"] = piece
+            if stats:
+                data.update(stats)
+            return data
+
+        with self.slots:
+            started = time.monotonic()
+            uncached = self._uncached_tokens(prompt)
+            prefill = uncached / self.prefill_rate
+            time.sleep(prefill)
+            decode_started = time.monotonic()
+
+            def stats():
+                # Eval counters in Ollama's final-chunk format (durations in ns)
+                return {
+                    # Like Ollama, cached prompt tokens are not counted as evaluated
+                    "prompt_eval_count": uncached,
+                    "prompt_eval_duration": int(prefill * 1e9),
+                    "eval_count": len(pieces),
+                    "eval_duration": int((time.monotonic() - decode_started) * 1e9),
+                    "total_duration": int((time.monotonic() - started) * 1e9),
+                    "load_duration": 0,
+                }
+
+            if body.get("stream", True) is False:
+                time.sleep(len(pieces) / self.token_rate)
+                self.send_json(handler, 200, chunk(text, True, stats()))
+                return
+
+            handler.send_response(200)
+            handler.send_header("Content-Type", "application/x-ndjson")
+            handler.send_header("Transfer-Encoding", "chunked")
+            handler.end_headers()
+
+            def write(data):
+                line = (json.dumps(data) + "\n").encode()
+                handler.wfile.write(b"%x\r\n%s\r\n" % (len(line), line))
+                handler.wfile.flush()
+
+            for piece in pieces:
+                time.sleep(1 / self.token_rate)
+                write(chunk(piece, False))
+            write(chunk("", True, stats()))
+            handler.wfile.write(b"0\r\n\r\n")
+            handler.wfile.flush()
+
+
+class FakeToolAPI(FakeServer):
+    """
+    Base for the tool API stand-ins: each request waits `latency` seconds
+    (+-50% jitter), then fails with `error_rate` or is throttled (429 with
+    Retry-After) with `rate_limit_rate`.
+    """
+
+    def __init__(self, latency=0.1, error_rate=0.0, rate_limit_rate=0.0, port=0):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        super().__init__(port)
+
+    def handle(self, handler, method, path, query, body):
+        time.sleep(self.latency * random.uniform(0.5, 1.5))
+        roll = random.random()
+        if roll < self.rate_limit_rate:
+            self.send_json(handler, 429, self.rate_limited(), {"Retry-After": 1, "X-RateLimit-Remaining": 0})
+        elif roll < self.rate_limit_rate + self.error_rate:
+            self.send_json(handler, 500, self.server_error())
+        else:
+            status, data = self.respond(path.rsplit("/", 1)[-1], {**query, **body})
+            self.send_json(handler, status, data, {"X-RateLimit-Remaining": 1000})
+
+
+class FakeSlack(FakeToolAPI):
+    """
+    users.list / conversations.list (cursor pagination over a generated
+    workspace), users.lookupByEmail and chat.postMessage. Base URL: <url>/api
+    """
+
+    def __init__(self, users=200, channels=50, **kwargs):
+        self.users = [
+            {
+                "id": f"U{i:08d}", "name": f"user{i}", "real_name": f"User {i}", "updated": 1,
+                "profile": {"real_name": f"User {i}", "display_name": f"user{i}", "email": f"user{i}@example.com"},
+            }
+            for i in range(users)
+        ]
+        self.channels = [{"id": f"C{i:08d}", "name": f"channel-{i}", "is_private": False, "updated": 1}
+                         for i in range(channels)]
+        self.channels.append({"id": "C99999999", "name": "alerts", "is_private": False, "updated": 1})
+        super().__init__(**kwargs)
+
+    def rate_limited(self):
+        return {"ok": False, "error": "ratelimited"}
+
+    def server_error(self):
+        return {"ok": False, "error": "fatal_error"}
+
+    def _page(self, items, key, params):
+        start = int(params.get("cursor") or 0)
+        limit = int(params.get("limit") or 100)
+        end = start + limit
+        return 200, {"ok": True, key: items[start:end],
+                     "response_metadata": {"next_cursor": str(end) if end < len(items) else ""}}
+
+    def respond(self, method, params):
+        if method == "users.list":
+            return self._page(self.users, "members", params)
+        if method == "conversations.list":
+            return self._page(self.channels, "channels", params)
+        if method == "users.lookupByEmail":
+            for user in self.users:
+                if user["profile"]["email"] == params.get("email"):
+                    return 200, {"ok": True, "user": user}
+            return 200, {"ok": False, "error": "users_not_found"}
+        if method == "chat.postMessage":
+            return 200, {"ok": True, "channel": params.get("channel"), "ts": f"{time.time():.6f}"}
+        return 404, {"ok": False, "error": "unknown_method"}
+
+
+class FakeAbuseIPDB(FakeToolAPI):
+    """
+    /check and /check-block with deterministic scores. Base URL: <url>/api/v2
+    """
+
+    def rate_limited(self):
+        return {"errors": [{"detail": "Daily rate limit of 1000 requests exceeded for this endpoint.", "status": 429}]}
+
+    def server_error(self):
+        return {"errors": [{"detail": "Internal server error.", "status": 500}]}
+
+    def respond(self, endpoint, params):
+        if endpoint == "check":
+            ip = params.get("ipAddress", "")
+            return 200, {"data": {
+                "ipAddress": ip, "isPublic": True, "ipVersion": 4, "isWhitelisted": False,
+                "abuseConfidenceScore": stable_int(ip, 101), "countryCode": "US",
+                "usageType": "Data Center/Web Hosting/Transit", "isp": "Example Hosting",
+                "domain": "example.net", "isTor": False, "totalReports": stable_int(ip, 500),
+                "numDistinctUsers": stable_int(ip, 60), "lastReportedAt": "2024-01-01T00:00:00+00:00",
+            }}
+        if endpoint == "check-block":
+            network = params.get("network", "")
+            base = network.split("/")[0].rsplit(".", 1)[0]
+            reported = [
+                {"ipAddress": f"{base}.{i}", "numReports": stable_int(f"{network}{i}", 50),
+                 "mostRecentReport": "2024-01-01T00:00:00+00:00",
+                 "abuseConfidenceScore": stable_int(f"{network}{i}", 101), "countryCode": "US"}
+                for i in range(1, 1 + stable_int(network, 20))
+            ]
+            return 200, {"data": {
+                "networkAddress": network.split("/")[0], "netmask": "255.255.255.0",
+                "numPossibleHosts": 254, "addressSpaceDesc": "Internet", "reportedAddress": reported,
+            }}
+        return 404, {"errors": [{"detail": "Not found.", "status": 404}]}
+
+
+class FakeOpenWeather(FakeToolAPI):
+    """
+    /weather and /forecast (40 3-hourly entries). Base URL: <url>/data/2.5
+    """
+
+    def rate_limited(self):
+        return {"cod": 429, "message": "Your account is temporary blocked due to exceeding of requests limitation."}
+
+    def server_error(self):
+        return {"cod": 500, "message": "Internal error"}
+
+    def respond(self, endpoint, params):
+        if endpoint == "weather":
+            seed = f'{params.get("lat")},{params.get("lon")}'
+            temp = stable_int(seed, 35)
+            return 200, {
+                "cod": 200, "name": "Somewhere", "wind": {"speed": 3.1},
+                "main": {"temp": temp, "feels_like": temp - 1, "humidity": stable_int(seed, 100)},
+                "weather": [{"main": "Clear", "description": "clear sky"}],
+            }
+        if endpoint == "forecast":
+            city = params.get("q", "")
+            entries = []
+            for i in range(40):
+                temp = stable_int(f"{city}{i}", 30)
+                entries.append({
+                    "dt_txt": f"2024-01-{1 + i // 8:02d} {(i % 8) * 3:02d}:00:00",
+                    "main": {"temp": temp, "temp_min": temp - 1, "temp_max": temp + 1},
+                    "weather": [{"main": ("Clear", "Clouds", "Rain")[stable_int(f"{city}{i}", 3)]}],
+                    "pop": stable_int(f"{city}{i}", 100) / 100,
+                })
+            return 200, {"cod": "200", "city": {"name": city}, "list": entries}
+        return 404, {"cod": 404, "message": "Not found"}
@@ -0,0 +1,247 @@
+"""
+Synthetic load test: starts local stand-ins for Ollama, Slack, AbuseIPDB and
+OpenWeather, then drives concurrent simulated sessions through chat_fn and
+reports turn latency, time to first token, throughput, memory and where the
+time goes per stage (from the telemetry spans).
+
+    python loadtest/load_test.py [loadtest/scenarios.json] [--sessions N] [--turns N] [--json out.json]
+"""
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import resource
+import tracemalloc
+from collections import defaultdict
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+
+from rich.console import Console
+from rich.table import Table
+from fake_servers import FakeOllama, FakeSlack, FakeAbuseIPDB, FakeOpenWeather
+
+console = Console()
+
+DEFAULT_SCENARIOS = os.path.join(HERE, "scenarios.json")
+
+
+def start_servers(config):
+    """
+    Starts the fake backends and points the app at them (before it is imported).
+    """
+    apis = config.get("apis", {})
+    servers = {
+        "ollama": FakeOllama(**config.get("ollama", {})),
+        "slack": FakeSlack(**apis.get("slack", {})),
+        "abuseipdb": FakeAbuseIPDB(**apis.get("abuseipdb", {})),
+        "openweather": FakeOpenWeather(**apis.get("openweather", {})),
+    }
+    os.environ["OLLAMA_HOST"] = servers["ollama"].url
+    os.environ["SLACK_API_URL"] = f'{servers["slack"].url}/api'
+    os.environ["ABUSEIPDB_API_URL"] = f'{servers["abuseipdb"].url}/api/v2'
+    os.environ["OPENWEATHER_API_URL"] = f'{servers["openweather"].url}/data/2.5'
+    for key in ("SLACK_API_KEY", "ABUSEIPDB_API_KEY", "WEATHERMAP_API_KEY"):
+        os.environ[key] = "load-test"
+    return servers
+
+
+def render(value, variables):
+    if isinstance(value, str):
+        for name, choice in variables.items():
+            value = value.replace("{" + name + "}", str(choice))
+        return value
+    if isinstance(value, list):
+        return [render(item, variables) for item in value]
+    if isinstance(value, dict):
+        return {key: render(item, variables) for key, item in value.items()}
+    return value
+
+
+def pick_turn(config, rng, ollama):
+    """
+    Draws a scenario by weight, fills in its variables and scripts the fake model's reply.
+    """
+    scenarios = config["scenarios"]
+    scenario = rng.choices(scenarios, weights=[s.get("weight", 1) for s in scenarios])[0]
+    variables = {name: rng.choice(values) for name, values in config.get("variables", {}).items()}
+    question = render(scenario["question"], variables)
+    ollama.scripts[question] = {
+        "tool_calls": render(scenario.get("tool_calls"), variables),
+        "answer_tokens": scenario.get("answer_tokens", 40),
+    }
+    return scenario["name"], question
+
+
+def classify(messages):
+    reply = messages[-1]["content"] if messages else ""
+    if "The model is busy" in reply:
+        return "busy"
+    if reply.startswith("Error:") or "\n\nError:" in reply:
+        return "error"
+    return "ok"
+
+
+async def run_session(app, config, rng, ollama, index, records):
+    await asyncio.sleep(config.get("ramp_up", 0) * index / max(config["sessions"], 1))
+    session = app.sessions.get()
+    low, high = config.get("think_time", [0, 0])
+    for _ in range(config["turns_per_session"]):
+        name, question = pick_turn(config, rng, ollama)
+        start = time.perf_counter()
+        ttft = None
+        first_new = len(session.messages)
+        try:
+            async for _, rendered in app.chat_fn(question, session.id):
+                last = rendered[-1] if rendered else {}
+                if (ttft is None and last.get("role") == "assistant" and "metadata" not in last
+                        and last["content"] and not last["content"].startswith("⏳")):
+                    ttft = time.perf_counter() - start
+            outcome = classify(session.messages)
+        except Exception as e:
+            outcome = "error"
+            console.print(f"[red]{name}: {type(e).__name__}: {e}[/red]")
+        latency = time.perf_counter() - start
+        tool_errors = sum(1 for msg in session.messages[first_new:] if msg["role"] == "tool" and '"error' in msg["content"])
+        records.append({"scenario": name, "latency": latency, "ttft": ttft if ttft is not None else latency,
+                        "outcome": outcome, "tool_errors": tool_errors})
+        await asyncio.sleep(rng.uniform(low, high))
+
+
+def percentile(values, q):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, int(round(q / 100 * len(ordered) + 0.5)) - 1))]
+
+
+def summarize(records):
+    groups = defaultdict(list)
+    for record in records:
+        groups[record["scenario"]].append(record)
+        groups["all"].append(record)
+    summary = {}
+    for name, group in groups.items():
+        latencies = [r["latency"] for r in group]
+        ttfts = [r["ttft"] for r in group]
+        summary[name] = {
+            "turns": len(group),
+            "ok": sum(r["outcome"] == "ok" for r in group),
+            "busy": sum(r["outcome"] == "busy" for r in group),
+            "errors": sum(r["outcome"] == "error" for r in group),
+            "tool_errors": sum(r["tool_errors"] for r in group),
+            "latency": {f"p{q}": percentile(latencies, q) for q in (50, 95, 99)},
+            "ttft": {f"p{q}": percentile(ttfts, q) for q in (50, 95, 99)},
+        }
+    return summary
+
+
+def stage_totals(metrics):
+    """
+    (count, total seconds) per stage from the telemetry histograms, e.g. "prefill/answer", "tool/get_forecast".
+    """
+    totals = {}
+    for labels, values in metrics.histograms.get("agent_stage_seconds", {}).items():
+        labels = dict(labels)
+        name = "/".join(filter(None, (labels["stage"], labels.get("llm"), labels.get("tool"))))
+        count, total = totals.get(name, (0, 0.0))
+        totals[name] = (count + values[-1], total + values[-2])
+    return totals
+
+
+def print_report(summary, extra):
+    table = Table(title="Load test")
+    for column in ("scenario", "turns", "ok", "busy", "errors", "tool err",
+                   "p50 s", "p95 s", "p99 s", "TTFT p50", "TTFT p95"):
+        table.add_column(column, justify="left" if column == "scenario" else "right")
+    for name in sorted(summary, key=lambda n: (n == "all", n)):
+        s = summary[name]
+        table.add_row(
+            name, str(s["turns"]), str(s["ok"]), str(s["busy"]), str(s["errors"]), str(s["tool_errors"]),
+            *(f'{s["latency"][p]:.2f}' for p in ("p50", "p95", "p99")),
+            *(f'{s["ttft"][p]:.2f}' for p in ("p50", "p95")),
+        )
+    console.print(table)
+    console.print(
+        f'Throughput: {extra["throughput"]:.2f} turns/s over {extra["wall_time"]:.1f}s | '
+        f'Peak RSS: {extra["peak_rss_mb"]:.0f} MB | Peak traced: {extra["peak_traced_mb"]:.1f} MB'
+    )
+    stages = Table(title="Time per stage")
+    for column in ("stage", "count", "mean s", "total s"):
+        stages.add_column(column, justify="left" if column == "stage" else "right")
+    for name, (count, total) in sorted(extra["stages"].items(), key=lambda item: -item[1][1]):
+        stages.add_row(name, str(count), f"{total / count:.3f}", f"{total:.1f}")
+    console.print(stages)
+    console.print(f'Backend requests: {extra["backend_requests"]}')
+    console.print(f'Scheduler: {extra["scheduler"]}')
+    console.print(f'Selection cache: {extra["selection_cache"]}')
+    console.print(f'Intent router: {extra["intent_router"]}')
+    console.print(f'Speculative answers: {extra["speculative_answers"]}')
+
+
+async def main(config):
+    servers = start_servers(config)
+    import Qwen_fc_app as app
+    from tool_cache import cache_stats
+    from llm_scheduler import scheduler
+    from telemetry import metrics
+    from rate_limit import rate_limiter
+    from selection_cache import selection_cache
+    from intent_router import intent_router
+    from speculative_answer import speculation_stats
+
+    rng = random.Random(config.get("seed"))
+    records = []
+    tracemalloc.start()
+    start = time.perf_counter()
+    await asyncio.gather(*(
+        run_session(app, config, random.Random(rng.random()), servers["ollama"], i, records)
+        for i in range(config["sessions"])
+    ))
+    wall_time = time.perf_counter() - start
+    _, peak_traced = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    extra = {
+        "wall_time": wall_time,
+        "throughput": len(records) / wall_time if wall_time else 0.0,
+        # ru_maxrss is in kilobytes on Linux (bytes on macOS); the fake servers share the process
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "peak_traced_mb": peak_traced / 2**20,
+        "backend_requests": {name: sum(server.requests.values()) for name, server in servers.items()},
+        "scheduler": scheduler.stats(),
+        "tool_cache": cache_stats(),
+        "rate_limits": rate_limiter.stats(),
+        "selection_cache": selection_cache.stats(),
+        "intent_router": intent_router.stats(),
+        "speculative_answers": speculation_stats.stats(),
+        "stages": stage_totals(metrics),
+    }
+    for server in servers.values():
+        server.close()
+    return summarize(records), extra
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("scenarios", nargs="?", default=DEFAULT_SCENARIOS, help="scenario config (JSON)")
+    parser.add_argument("--sessions", type=int, help="override the number of concurrent sessions")
+    parser.add_argument("--turns", type=int, help="override the turns per session")
+    parser.add_argument("--json", help="also write the report to this file")
+    args = parser.parse_args()
+
+    with open(args.scenarios) as f:
+        config = json.load(f)
+    if args.sessions:
+        config["sessions"] = args.sessions
+    if args.turns:
+        config["turns_per_session"] = args.turns
+
+    summary, extra = asyncio.run(main(config))
+    print_report(summary, extra)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"config": config, "summary": summary, **extra}, f, indent=2)
@@ -0,0 +1,98 @@
+import os
+import json
+
+# Default prompt budget for a single tool result
+TOOL_RESULT_MAX_TOKENS = int(os.environ.get("TOOL_RESULT_MAX_TOKENS", "1500"))
+# Rough characters per token for English/JSON text with BPE tokenizers
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text):
+    """
+    Cheap token estimate used for budgets (no tokenizer round-trip).
+    """
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def compact_json(data):
+    return json.dumps(data, separators=(",", ":"), ensure_ascii=False)
+
+
+def parse_result(result):
+    """
+    Tools return either dicts or the raw JSON text of the remote API.
+    Returns the decoded value, or the original text if it is not JSON.
+    """
+    if isinstance(result, (bytes, str)):
+        try:
+            return json.loads(result)
+        except ValueError:
+            return result
+    return result
+
+
+def _longest_list(data):
+    """
+    Returns (container, key) of the longest list in the top two levels of `data`.
+    """
+    best = (None, None, 0)
+    candidates = [(None, None, data)]
+    if isinstance(data, dict):
+        candidates += [(data, key, value) for key, value in data.items()]
+        for key, value in data.items():
+            if isinstance(value, dict):
+                candidates += [(value, k, v) for k, v in value.items()]
+    for container, key, value in candidates:
+        if isinstance(value, list) and len(value) > best[2]:
+            best = (container, key, len(value))
+    return best[0], best[1]
+
+
+def fit_to_budget(data, max_tokens):
+    """
+    Serializes `data` compactly within `max_tokens`.
+    Lists are shortened first (keeping valid JSON and noting how many items
+    were omitted); anything still over budget is cut with a truncation marker.
+    """
+    text = data if isinstance(data, str) else compact_json(data)
+    if estimate_tokens(text) <= max_tokens:
+        return text
+
+    if isinstance(data, (dict, list)):
+        data = json.loads(text)  # private copy to shrink
+        omitted = {}  # id(list) -> [list, items dropped]
+        while estimate_tokens(text) > max_tokens:
+            container, key = _longest_list(data)
+            items = data if container is None else container[key]
+            if not isinstance(items, list) or len(items) <= 1:
+                break  # no list left to shorten (e.g. a dict of long strings): cut the text
+            keep = len(items) // 2
+            omitted.setdefault(id(items), [items, 0])[1] += len(items) - keep
+            del items[keep:]
+            text = compact_json(data)
+        for items, count in omitted.values():
+            items.append(f"…{count} more items omitted")
+        text = compact_json(data)
+        if estimate_tokens(text) <= max_tokens:
+            return text
+
+    limit = max_tokens * CHARS_PER_TOKEN
+    cut = len(text) - limit
+    return f"{text[:limit]}…[truncated {estimate_tokens(text[limit:])} tokens, {cut} chars]"
+
+
+def render_result(result, projector=None, max_tokens=TOOL_RESULT_MAX_TOKENS):
+    """
+    Turns a raw tool result into the text that enters the prompt: the
+    projector (if any) keeps only the fields the model needs, then the value
+    is serialized compactly and fitted to the token budget.
+    """
+    data = parse_result(result)
+    if projector is not None:
+        try:
+            data = projector(data)
+        except (KeyError, TypeError, ValueError, AttributeError, IndexError):
+            pass  # unexpected shape (e.g. an API error): keep the unprojected value
+    if not isinstance(data, (dict, list, str)):
+        data = str(data)
+    return fit_to_budget(data, max_tokens or TOOL_RESULT_MAX_TOKENS)
@@ -0,0 +1,67 @@
+from collections import OrderedDict
+from template import function_calling_prompt_template, system_prompt, slack_prompt
+from registry import registry
+
+# Prompts are laid out for Ollama's /api/chat so the prefix stays byte-identical:
+# one static system message first (base behaviour, tool instructions and
+# definitions, Slack guidance), then the conversation, then any per-stage
+# instruction. Only the tail changes between calls, so the KV cache for the
+# system message and older turns is reused instead of being prefilled again.
+
+# A few variants can be live when the tool router sends subsets of the definitions
+SYSTEM_CACHE_SIZE = 32
+_system_cache = OrderedDict()
+
+
+def static_system_prompt(definitions):
+    """
+    Returns the static system message for the given tool definitions.
+    Built once per set of definitions (and registry version) and shared by
+    both stages and every turn.
+    """
+    key = (registry.version, tuple(registry.names(definitions)))
+    cached = _system_cache.get(key)
+    if cached is not None:
+        _system_cache.move_to_end(key)
+    else:
+        tool_definitions = registry.definitions_json(definitions)
+        cached = (
+            f"{system_prompt.strip()}\n\n"
+            f"{function_calling_prompt_template.replace('%%tool_definitions%%', tool_definitions).strip()}\n\n"
+            f"{slack_prompt.strip()}"
+        )
+        _system_cache[key] = cached
+        if len(_system_cache) > SYSTEM_CACHE_SIZE:
+            _system_cache.popitem(last=False)
+    return cached
+
+
+def to_chat_message(msg):
+    """
+    Converts an internal message dict to an /api/chat message.
+    """
+    if msg["role"] == "tool":
+        name = msg.get("name", "tool")
+        return {"role": "tool", "tool_name": name, "content": f'Tool [{name}]: {msg["content"]}'}
+    return {"role": msg["role"], "content": msg["content"]}
+
+
+def build_chat_messages(messages, definitions, instruction=None):
+    """
+    Static system message first, conversation history after it and the
+    (optional) stage instruction last.
+    """
+    chat = [{"role": "system", "content": static_system_prompt(definitions)}]
+    return continue_chat(chat, messages, instruction)
+
+
+def continue_chat(chat, messages, instruction=None):
+    """
+    Appends messages (and an optional trailing instruction) to a chat that was
+    already sent, leaving its prefix untouched. Returns a new list.
+    """
+    chat = list(chat)
+    chat.extend(to_chat_message(msg) for msg in messages)
+    if instruction:
+        chat.append({"role": "system", "content": instruction.strip()})
+    return chat
@@ -0,0 +1,228 @@
+import os
+import time
+import threading
+import email.utils
+import requests
+
+# Longest a tool call waits for a rate-limit slot before failing with rate_limited
+RATE_LIMIT_MAX_WAIT = float(os.environ.get("RATE_LIMIT_MAX_WAIT", "10"))
+# Retries of a request answered with 429 (only when Retry-After fits in the wait budget)
+RATE_LIMIT_RETRIES = int(os.environ.get("RATE_LIMIT_RETRIES", "2"))
+# Plan quotas (AbuseIPDB free plan, OpenWeather free plan)
+ABUSEIPDB_DAILY_LIMIT = int(os.environ.get("ABUSEIPDB_DAILY_LIMIT", "1000"))
+ABUSEIPDB_BLOCK_DAILY_LIMIT = int(os.environ.get("ABUSEIPDB_BLOCK_DAILY_LIMIT", "100"))
+ABUSEIPDB_PER_SECOND = float(os.environ.get("ABUSEIPDB_PER_SECOND", "10"))
+OPENWEATHER_PER_MINUTE = int(os.environ.get("OPENWEATHER_PER_MINUTE", "60"))
+# Block applied after a 429 that carries no Retry-After
+DEFAULT_RETRY_AFTER = 1.0
+
+
+class RateLimited(Exception):
+    """
+    Raised when a request would have to wait longer than its deadline for a
+    slot (or was still throttled after the retries).
+    """
+
+    def __init__(self, api, endpoint, retry_after):
+        super().__init__(f"{api} {endpoint}: rate limited, retry in {retry_after:.0f}s")
+        self.api = api
+        self.endpoint = endpoint
+        self.retry_after = retry_after
+
+    def result(self):
+        """
+        Structured tool result for the model.
+        """
+        return {"status": "error", "error": "rate_limited", "api": self.api,
+                "retry_after": round(self.retry_after)}
+
+
+class TokenBucket:
+    """
+    `capacity` tokens refilled at `rate` per second. Tokens may go negative:
+    each reservation takes one, and the deficit is the queue of waiters.
+    """
+
+    def __init__(self, name, rate, capacity):
+        self.name = name
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+
+    def refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait(self):
+        """
+        Seconds until one more token is available.
+        """
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+
+def per_second(n, burst=None):
+    return TokenBucket("second", n, burst or n)
+
+
+def per_minute(n):
+    return TokenBucket("minute", n / 60, n)
+
+
+def per_day(n):
+    return TokenBucket("day", n / 86400, n)
+
+
+class Limit:
+    """
+    Rate limit of one API endpoint: one or more token buckets (the last one is
+    the plan quota, corrected from X-RateLimit-Remaining) and a block set from
+    Retry-After when the API throttles. Thread-safe; waiters are served in
+    reservation order.
+    """
+
+    def __init__(self, api, endpoint, *buckets):
+        self.api = api
+        self.endpoint = endpoint
+        self.buckets = buckets
+        self.blocked_until = 0.0
+        self.remaining = None       # last X-RateLimit-Remaining seen
+        self.requests = 0
+        self.waited = 0
+        self.wait_seconds = 0.0
+        self.rejected = 0
+        self.throttled = 0          # 429 responses
+        self._lock = threading.Lock()
+
+    def reserve(self, max_wait):
+        """
+        Takes a slot and returns the seconds to wait before using it, or raises
+        RateLimited (taking nothing) if that is longer than max_wait.
+        """
+        with self._lock:
+            now = time.monotonic()
+            for bucket in self.buckets:
+                bucket.refill(now)
+            wait = max([self.blocked_until - now, 0.0] + [bucket.wait() for bucket in self.buckets])
+            if wait > max_wait:
+                self.rejected += 1
+                raise RateLimited(self.api, self.endpoint, wait)
+            for bucket in self.buckets:
+                bucket.tokens -= 1
+            self.requests += 1
+            if wait > 0:
+                self.waited += 1
+                self.wait_seconds += wait
+            return wait
+
+    def update(self, response):
+        """
+        Applies X-RateLimit-Remaining / Retry-After from a response.
+        A 429 blocks the endpoint for Retry-After; otherwise the remaining
+        count caps the quota bucket.
+        """
+        remaining = response.headers.get("X-RateLimit-Remaining")
+        retry_after = _retry_after(response.headers.get("Retry-After"))
+        with self._lock:
+            now = time.monotonic()
+            if remaining is not None and remaining.strip().isdigit():
+                self.remaining = int(remaining)
+            if response.status_code == 429:
+                self.throttled += 1
+                self.blocked_until = max(self.blocked_until, now + (retry_after or DEFAULT_RETRY_AFTER))
+            elif self.remaining is not None and remaining is not None:
+                quota = self.buckets[-1]
+                quota.refill(now)
+                quota.tokens = min(quota.tokens, self.remaining)
+
+    def stats(self):
+        with self._lock:
+            now = time.monotonic()
+            for bucket in self.buckets:
+                bucket.refill(now)
+            return {
+                "tokens": {bucket.name: round(bucket.tokens, 2) for bucket in self.buckets},
+                "remaining": self.remaining,
+                "blocked_for": round(max(self.blocked_until - now, 0.0), 2),
+                "requests": self.requests,
+                "waited": self.waited,
+                "wait_seconds": round(self.wait_seconds, 3),
+                "rejected": self.rejected,
+                "throttled": self.throttled,
+            }
+
+
+def _retry_after(value):
+    """
+    Retry-After in seconds (delta-seconds or an HTTP date), or None.
+    """
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        try:
+            return max(email.utils.parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+        except (TypeError, ValueError):
+            return None
+
+
+def default_limits():
+    """
+    Limits per (api, endpoint); "*" covers the API's other endpoints.
+    Slack methods follow their documented tiers (Tier 2: 20/min, Tier 3: 50/min,
+    chat.postMessage about 1/s with short bursts).
+    """
+    return {
+        ("slack", "chat.postMessage"): Limit("slack", "chat.postMessage", per_second(1, burst=3)),
+        ("slack", "users.list"): Limit("slack", "users.list", per_minute(20)),
+        ("slack", "conversations.list"): Limit("slack", "conversations.list", per_minute(20)),
+        ("slack", "users.lookupByEmail"): Limit("slack", "users.lookupByEmail", per_minute(50)),
+        ("slack", "*"): Limit("slack", "*", per_minute(20)),
+        ("abuseipdb", "check"): Limit("abuseipdb", "check",
+                                      per_second(ABUSEIPDB_PER_SECOND), per_day(ABUSEIPDB_DAILY_LIMIT)),
+        ("abuseipdb", "check-block"): Limit("abuseipdb", "check-block",
+                                            per_second(ABUSEIPDB_PER_SECOND), per_day(ABUSEIPDB_BLOCK_DAILY_LIMIT)),
+        ("abuseipdb", "*"): Limit("abuseipdb", "*", per_second(ABUSEIPDB_PER_SECOND), per_day(ABUSEIPDB_DAILY_LIMIT)),
+        ("openweather", "*"): Limit("openweather", "*", per_minute(OPENWEATHER_PER_MINUTE)),
+    }
+
+
+class RateLimiter:
+    """
+    Shared by every session and tool thread: all outbound tool API requests go
+    through request(), which waits for a slot (up to a deadline), sends the
+    request, learns from the rate-limit headers and retries 429s.
+    """
+
+    def __init__(self, limits=None, max_wait=RATE_LIMIT_MAX_WAIT, retries=RATE_LIMIT_RETRIES):
+        self.limits = default_limits() if limits is None else limits
+        self.max_wait = max_wait
+        self.retries = retries
+
+    def limit(self, api, endpoint):
+        return self.limits.get((api, endpoint)) or self.limits[(api, "*")]
+
+    def request(self, api, endpoint, method, url, max_wait=None, **kwargs):
+        """
+        requests.request() under the endpoint's limit. Raises RateLimited when
+        no slot is free within max_wait seconds (RATE_LIMIT_MAX_WAIT by default)
+        or the API still throttles after the retries.
+        """
+        limit = self.limit(api, endpoint)
+        deadline = time.monotonic() + (self.max_wait if max_wait is None else max_wait)
+        for attempt in range(self.retries + 1):
+            time.sleep(limit.reserve(max(deadline - time.monotonic(), 0.0)))
+            response = requests.request(method, url, **kwargs)
+            limit.update(response)
+            if response.status_code != 429:
+                return response
+        retry_after = _retry_after(response.headers.get("Retry-After")) or DEFAULT_RETRY_AFTER
+        raise RateLimited(api, endpoint, retry_after)
+
+    def stats(self):
+        return {f"{api}/{endpoint}": limit.stats() for (api, endpoint), limit in self.limits.items()}
+
+
+rate_limiter = RateLimiter()
+rate_limited_request = rate_limiter.request
@@ -1,9 +1,188 @@
-available_functions = {}
-definitions = []
-
-def register_tool(name, definition):
-    def decorator(fn):
-        available_functions[name] = fn
-        definitions.append(definition)
-        return fn
-    return decorator
+import json
+import asyncio
+import inspect
+import functools
+from tool_cache import cached_tool
+from projection import render_result
+from validation import compile_object
+
+
+def run_coroutine_tool(fn):
+    """
+    Sync adapter for an async tool that is cached: its single-flight cache is
+    thread based, so call() runs it on the executor's worker threads, where no
+    event loop is running.
+    """
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        return asyncio.run(fn(*args, **kwargs))
+    wrapper.__signature__ = inspect.signature(fn)
+    return wrapper
+
+
+class ToolRegistry:
+    """
+    Registered tools, compiled once at registration:
+    - the serialized JSON of each definition (joined for the prompt, so no
+      json.dumps of the whole list per turn),
+    - an argument validator/coercer derived from the parameter schema,
+    - the cache wrapper and the result renderer.
+    Tools may be plain or `async def` functions: call() runs any tool (on a
+    worker thread), acall() awaits the uncached async ones.
+    `version` changes on every registration and keys anything derived from the registry.
+    """
+
+    def __init__(self):
+        self.functions = {}          # name -> callable (cache-wrapped when a policy is given)
+        self.coroutines = {}         # name -> async tool function awaited directly by acall
+        self.definitions = []
+        self.side_effecting = set()  # tools whose calls change something outside the app
+        self.renderers = {}          # name -> (projector, max_tokens) for the prompt
+        self.validators = {}         # name -> validate(args) -> (coerced args, errors)
+        self.parameters = {}         # name -> parameter schema (echoed back in argument errors)
+        self.serialized = {}         # name -> json.dumps(definition)
+        self.intents = {}            # name -> intent_router.Intent patterns dispatched without the LLM
+        self.version = 0
+        self._definitions_json = None
+        self._schemas = {}           # (version, tool names) -> selection schema
+
+    def register(self, name, definition, side_effects=False, cache=None, projector=None, max_tokens=None,
+                 intents=None):
+        """
+        cache: optional tool_cache.CachePolicy for read-only tools.
+        projector: optional fn(decoded result) -> the fields the model needs.
+        max_tokens: prompt budget for one result (default TOOL_RESULT_MAX_TOKENS).
+        intents: optional intent_router.Intent list; a question matching one is
+        dispatched to this tool without the selection call (read-only tools only).
+        """
+        if intents and side_effects:
+            raise ValueError(f"{name}: side-effecting tools cannot be dispatched by intent patterns")
+
+        def decorator(fn):
+            sync_fn = fn
+            if inspect.iscoroutinefunction(fn):
+                sync_fn = run_coroutine_tool(fn)
+                if not cache or side_effects:
+                    self.coroutines[name] = fn
+            self.functions[name] = cached_tool(name, sync_fn, cache) if cache and not side_effects else sync_fn
+            self.definitions.append(definition)
+            if side_effects:
+                self.side_effecting.add(name)
+            self.renderers[name] = (projector, max_tokens)
+            parameters = definition.get("function", definition).get("parameters", {})
+            self.parameters[name] = parameters
+            self.validators[name] = compile_object(parameters).validate
+            self.serialized[name] = json.dumps(definition)
+            if intents:
+                self.intents[name] = list(intents)
+            self.version += 1
+            self._definitions_json = None
+            return fn
+        return decorator
+
+    def names(self, definitions=None):
+        return [d.get("function", d).get("name") for d in (self.definitions if definitions is None else definitions)]
+
+    def definitions_json(self, definitions=None):
+        """
+        JSON of the given definitions (all by default), identical to
+        json.dumps(definitions) but assembled from the per-tool blocks.
+        """
+        if definitions is None or definitions is self.definitions:
+            if self._definitions_json is None:
+                self._definitions_json = "[" + ", ".join(self.serialized[n] for n in self.names()) + "]"
+            return self._definitions_json
+        return "[" + ", ".join(self.serialized[n] for n in self.names(definitions)) + "]"
+
+    def selection_schema(self, definitions=None):
+        """
+        JSON schema for a structured selection reply (Ollama's `format`):
+        {"tool_calls": [...], "answer": "..."} where each call is one of the
+        given tools' name + argument object. An empty list is the "no tool" answer.
+        """
+        names = tuple(self.names(definitions))
+        key = (self.version, names)
+        if key not in self._schemas:
+            variants = []
+            for name in names:
+                arguments = {"type": "object", "properties": {}, **self.parameters[name]}
+                variants.append({
+                    "type": "object",
+                    "properties": {
+                        "name": {"type": "string", "enum": [name]},
+                        "arguments": {**arguments, "additionalProperties": False},
+                    },
+                    "required": ["name", "arguments"],
+                })
+            self._schemas[key] = {
+                "type": "object",
+                "properties": {
+                    "tool_calls": {"type": "array", "items": {"anyOf": variants}},
+                    "answer": {"type": "string"},
+                },
+                "required": ["tool_calls", "answer"],
+            }
+        return self._schemas[key]
+
+    def validate(self, call):
+        """
+        Checks a tool call before dispatch.
+        Returns (name, coerced arguments, None) or (name, None, structured error).
+        """
+        if not isinstance(call, dict):
+            return None, None, {"status": "error", "error": "invalid_call", "details": ["tool call must be an object"]}
+        name = call.get("name")
+        if name not in self.functions:
+            return name, None, {
+                "status": "error",
+                "error": "unknown_tool",
+                "tool": name,
+                "available_tools": self.names(),
+            }
+        args, errors = self.validators[name](call.get("arguments"))
+        if errors:
+            return name, None, {
+                "status": "error",
+                "error": "invalid_arguments",
+                "tool": name,
+                "details": errors,
+                "parameters": self.parameters[name],
+            }
+        return name, args, None
+
+    def call(self, call):
+        """
+        Validates and dispatches a tool call; invalid calls are rejected
+        without touching the remote API.
+        """
+        name, args, error = self.validate(call)
+        if error:
+            return error
+        return self.functions[name](**args)
+
+    async def acall(self, call):
+        """
+        Async form of call for the tools in `coroutines`; the others run
+        through call() on the executor's tool pool.
+        """
+        name, args, error = self.validate(call)
+        if error:
+            return error
+        return await self.coroutines[name](**args)
+
+    def render(self, name, result):
+        """
+        Projects, compactly serializes and budgets a tool result for the prompt.
+        """
+        projector, max_tokens = self.renderers.get(name, (None, None))
+        return render_result(result, projector, max_tokens)
+
+
+registry = ToolRegistry()
+
+# Module-level names used by the tool modules and the scripts
+register_tool = registry.register
+available_functions = registry.functions
+definitions = registry.definitions
+side_effecting_tools = registry.side_effecting
+render_tool_result = registry.render
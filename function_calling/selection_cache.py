@@ -0,0 +1,214 @@
+import os
+import re
+import json
+import time
+import hashlib
+import ipaddress
+import threading
+from collections import OrderedDict
+from registry import registry
+
+# Reuse tool-selection decisions for repeated questions (0 disables)
+SELECTION_CACHE = os.environ.get("SELECTION_CACHE", "1") == "1"
+SELECTION_CACHE_TTL = float(os.environ.get("SELECTION_CACHE_TTL", "3600"))
+SELECTION_CACHE_SIZE = int(os.environ.get("SELECTION_CACHE_SIZE", "2048"))
+# Previous turns (question and reply) that are part of the key; follow-ups like
+# "and in Paris?" or "and there?" depend on them
+SELECTION_CACHE_CONTEXT = int(os.environ.get("SELECTION_CACHE_CONTEXT", "1"))
+EMA_ALPHA = 0.2
+
+# Punctuation stripped from the ends of a word ("london?", "(1.2.3.4)")
+EDGE_PUNCTUATION = "?!,;:\"'()[]{}."
+EMAIL_RE = re.compile(r"^[^@\s]+@[^@\s]+\.[a-z]{2,}$", re.IGNORECASE)
+SLACK_ID_RE = re.compile(r"^[UCGDW][A-Z0-9]{8,}$")
+NUMBER_RE = re.compile(r"^-?\d+(?:\.\d+)?$")
+
+
+def token_kind(token):
+    """
+    Type of a word that is parameterized wherever it appears, or None.
+    """
+    if NUMBER_RE.match(token):
+        return "number"
+    if EMAIL_RE.match(token):
+        return "email"
+    if SLACK_ID_RE.match(token):
+        return "slack_id"
+    try:
+        if "/" in token:
+            ipaddress.ip_network(token, strict=False)
+            return "cidr"
+        ipaddress.ip_address(token)
+        return "ip"
+    except ValueError:
+        return None
+
+
+def tokenize(question):
+    words = [word.strip(EDGE_PUNCTUATION) for word in question.split()]
+    return [word for word in words if word]
+
+
+def same_value(value, text):
+    if isinstance(value, bool):
+        return False
+    if isinstance(value, (int, float)):
+        return NUMBER_RE.match(text) is not None and float(text) == value
+    if not isinstance(value, str):
+        return False
+    value = value.strip()
+    kind = token_kind(text)
+    if kind in ("ip", "cidr"):
+        try:
+            if kind == "ip":
+                return ipaddress.ip_address(value) == ipaddress.ip_address(text)
+            return ipaddress.ip_network(value, strict=False) == ipaddress.ip_network(text, strict=False)
+        except ValueError:
+            return False
+    return value.casefold() == text.casefold()
+
+
+def bind(value, text):
+    """
+    Value for a slot, typed like the argument it was cached from.
+    """
+    if isinstance(value, int):
+        return int(float(text))
+    if isinstance(value, float):
+        return float(text)
+    return text
+
+
+class SelectionCache:
+    """
+    Tool-selection decisions keyed on the question's shape and its context.
+    Typed words (IPs, networks, emails, Slack IDs, numbers) are slots, so
+    "is 1.2.3.4 abused?" also answers "is 5.6.7.8 abused?". Plain words are
+    part of the key: nothing tells a city from "Celsius" or "brief", so
+    "weather in London" only answers itself (the intent router covers such
+    questions). A question whose typed words are not all used by the
+    arguments is not cached, nor is a decision that calls a side-effecting
+    tool. The key also
+    holds the registry version, the tools offered and the previous turn(s):
+    user questions and assistant replies.
+    """
+
+    def __init__(self, ttl=SELECTION_CACHE_TTL, max_entries=SELECTION_CACHE_SIZE, context=SELECTION_CACHE_CONTEXT):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.context = context
+        self._entries = OrderedDict()   # key -> (expires_at, template calls)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.stored = 0
+        self.bypassed = 0               # decisions with side effects, never cached
+        self.select_seconds = None      # average duration of an LLM selection (EMA)
+        self.saved_seconds = 0.0
+
+    def fingerprint(self, messages, names):
+        previous = []
+        if self.context:
+            previous = [msg for msg in messages[:-1] if msg["role"] in ("user", "assistant")][-2 * self.context:]
+        text = json.dumps([registry.version, sorted(names),
+                           [[m["role"], " ".join(tokenize(m["content"])).casefold()] for m in previous]])
+        return hashlib.sha1(text.encode()).hexdigest()
+
+    def _shape(self, words):
+        """
+        Key words and slot positions for a question: typed words become slots.
+        """
+        base = [f"<{kind}>" if kind else word.casefold() for word, kind in ((w, token_kind(w)) for w in words)]
+        return base, [(i, i + 1) for i, word in enumerate(base) if word.startswith("<")]
+
+    def lookup(self, question, messages, names):
+        """
+        Calls for the question if a cached decision fits it, else None.
+        """
+        words = tokenize(question)
+        context = self.fingerprint(messages, names)
+        now = time.monotonic()
+        key_words, slots = self._shape(words)
+        key = (context, " ".join(key_words))
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] <= now:
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            if self.select_seconds:
+                self.saved_seconds += self.select_seconds
+        values = [" ".join(words[start:end]) for start, end in slots]
+        return self._fill(entry[1], values)
+
+    def _fill(self, template, values):
+        if isinstance(template, dict):
+            if "$slot" in template:
+                return bind(template["like"], values[template["$slot"]])
+            return {key: self._fill(value, values) for key, value in template.items()}
+        if isinstance(template, list):
+            return [self._fill(value, values) for value in template]
+        return template
+
+    def store(self, question, messages, names, calls, duration):
+        """
+        Caches the LLM's decision for the question (when it can be generalized
+        safely) and records how long the selection took.
+        """
+        if not calls:
+            return
+        with self._lock:
+            self.select_seconds = duration if self.select_seconds is None else \
+                self.select_seconds + EMA_ALPHA * (duration - self.select_seconds)
+        if any(isinstance(call, dict) and call.get("name") in registry.side_effecting for call in calls):
+            with self._lock:
+                self.bypassed += 1
+            return
+        if any(registry.validate(call)[2] for call in calls):
+            return
+
+        words = tokenize(question)
+        key_words, slots = self._shape(words)
+        used = set()
+        template = self._template(calls, words, slots, used)
+        # Every slot must come from the arguments, or other values would reuse these calls
+        if used != set(range(len(slots))):
+            return
+        key = (self.fingerprint(messages, names), " ".join(key_words))
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, template)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            self.stored += 1
+
+    def _template(self, value, words, slots, used):
+        if isinstance(value, dict):
+            return {key: self._template(item, words, slots, used) for key, item in value.items()}
+        if isinstance(value, list):
+            return [self._template(item, words, slots, used) for item in value]
+        for index, (start, end) in enumerate(slots):
+            if same_value(value, " ".join(words[start:end])):
+                used.add(index)
+                return {"$slot": index, "like": value}
+        return value
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "stored": self.stored,
+                "bypassed": self.bypassed,
+                "size": len(self._entries),
+                "saved_seconds": round(self.saved_seconds, 3),
+            }
+
+
+selection_cache = SelectionCache()
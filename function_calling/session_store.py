@@ -0,0 +1,127 @@
+import os
+import json
+import time
+import uuid
+import sqlite3
+import threading
+from collections import OrderedDict
+from context_window import new_context, message_tokens
+
+# Optional SQLite file so conversations survive restarts (empty = in-memory only)
+SESSION_DB = os.environ.get("SESSION_DB", "")
+# Sessions unused for this many seconds are dropped from memory (and reloaded from SESSION_DB if set)
+SESSION_IDLE_TIMEOUT = float(os.environ.get("SESSION_IDLE_TIMEOUT", "3600"))
+# Most sessions kept in memory; the least recently used are dropped first
+SESSION_MAX = int(os.environ.get("SESSION_MAX", "1000"))
+# Message fields stored as columns; anything else (timings, footer, trace id) goes into `meta`
+MESSAGE_COLUMNS = ("role", "name", "content", "tokens")
+
+
+class Session:
+    """
+    One conversation: its structured messages (role, name, content, token
+    count, timings) and its context state (context windows, selection chat...).
+    """
+
+    def __init__(self, session_id, messages=None):
+        self.id = session_id
+        self.messages = messages or []
+        self.context = new_context(session_id)
+        self.last_used = time.monotonic()
+        self.saved = len(self.messages)   # messages already written to SQLite
+
+
+class SessionStore:
+    """
+    Sessions by id, kept server side so a turn appends to the stored history
+    instead of rebuilding it from the chatbot transcript.
+    In memory as an LRU; idle sessions are evicted. With a SQLite file,
+    save() writes only the messages added since the previous save and evicted
+    sessions are reloaded on their next turn (their context windows start over).
+    """
+
+    def __init__(self, db_path=SESSION_DB, idle_timeout=SESSION_IDLE_TIMEOUT, max_sessions=SESSION_MAX):
+        self.idle_timeout = idle_timeout
+        self.max_sessions = max_sessions
+        self.sessions = OrderedDict()   # id -> Session, least recently used first
+        self.evicted = 0
+        self._lock = threading.Lock()
+        self._db = None
+        if db_path:
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._init_db()
+
+    def _init_db(self):
+        with self._db:
+            self._db.execute("CREATE TABLE IF NOT EXISTS sessions (id TEXT PRIMARY KEY, created REAL, updated REAL)")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS messages (session TEXT, seq INTEGER, role TEXT, name TEXT, "
+                "content TEXT, tokens INTEGER, meta TEXT, PRIMARY KEY (session, seq))"
+            )
+
+    def _load(self, session_id):
+        rows = self._db.execute(
+            "SELECT role, name, content, tokens, meta FROM messages WHERE session = ? ORDER BY seq", (session_id,)
+        )
+        messages = []
+        for role, name, content, tokens, meta in rows:
+            msg = {"role": role, "content": content, "tokens": tokens, **json.loads(meta or "{}")}
+            if name is not None:
+                msg["name"] = name
+            messages.append(msg)
+        return messages
+
+    def get(self, session_id=None):
+        """
+        Returns the session with this id, loading it from SQLite or creating
+        it when it is not in memory (a new id is generated when None).
+        """
+        session_id = session_id or uuid.uuid4().hex
+        with self._lock:
+            session = self.sessions.get(session_id)
+            if session is None:
+                session = Session(session_id, self._load(session_id) if self._db is not None else None)
+                self.sessions[session_id] = session
+            else:
+                self.sessions.move_to_end(session_id)
+            session.last_used = time.monotonic()
+            self._evict()
+        return session
+
+    def _evict(self):
+        now = time.monotonic()
+        while self.sessions:
+            oldest = next(iter(self.sessions.values()))
+            if len(self.sessions) <= self.max_sessions and now - oldest.last_used <= self.idle_timeout:
+                return
+            del self.sessions[oldest.id]
+            self.evicted += 1
+
+    def save(self, session):
+        """
+        Records token counts of the messages added since the last save and
+        writes them to SQLite (if configured). Call once the turn is complete.
+        """
+        new = session.messages[session.saved:]
+        for msg in new:
+            msg["tokens"] = message_tokens(msg)
+        if self._db is not None and new:
+            rows = [
+                (session.id, seq, msg["role"], msg.get("name"), msg["content"], msg["tokens"],
+                 json.dumps({k: v for k, v in msg.items() if k not in MESSAGE_COLUMNS}, default=str))
+                for seq, msg in enumerate(new, session.saved)
+            ]
+            now = time.time()
+            with self._lock, self._db:
+                self._db.executemany("INSERT OR REPLACE INTO messages VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+                self._db.execute(
+                    "INSERT INTO sessions VALUES (?, ?, ?) ON CONFLICT(id) DO UPDATE SET updated = excluded.updated",
+                    (session.id, now, now),
+                )
+        session.saved = len(session.messages)
+
+    def stats(self):
+        return {"sessions": len(self.sessions), "evicted": self.evicted}
+
+
+sessions = SessionStore()
@@ -0,0 +1,341 @@
+import os
+import re
+import time
+import bisect
+import difflib
+import sqlite3
+import threading
+import requests
+from dotenv import load_dotenv
+from rich.console import Console
+from rate_limit import rate_limited_request, RateLimited
+
+load_dotenv()
+
+console = Console()
+
+SLACK_API_URL = os.environ.get("SLACK_API_URL", "https://slack.com/api")
+# Full re-list of the workspace at most this often; lookups in between are served locally
+SLACK_DIRECTORY_REFRESH = float(os.environ.get("SLACK_DIRECTORY_REFRESH", "900"))
+# Optional SQLite file so the directory survives restarts (empty = in-memory only)
+SLACK_DIRECTORY_DB = os.environ.get("SLACK_DIRECTORY_DB", "")
+PAGE_SIZE = 200
+
+
+class SlackDirectory:
+    """
+    Local index of Slack users and channels.
+    Synced with cursor pagination (users.list / conversations.list), refreshed
+    in the background once older than `refresh_interval`. The list APIs have no
+    "changed since" filter, so every sync pages through the whole workspace;
+    only the rows that were added, changed or removed are re-indexed and
+    written to SQLite. Name resolution (exact, prefix and fuzzy matching on
+    names, handles, emails and channel names) runs entirely in memory.
+    """
+
+    def __init__(self, db_path=SLACK_DIRECTORY_DB, refresh_interval=SLACK_DIRECTORY_REFRESH):
+        self.refresh_interval = refresh_interval
+        self.users = {}      # id -> {"id", "name", "real_name", "display_name", "email", "updated"}
+        self.channels = {}   # id -> {"id", "name", "is_private", "updated"}
+        self.synced_at = 0.0
+        self._keys = {}      # normalized name/email/ID -> set of (type, id)
+        self._words = {}     # single words of multi-word names -> set of (type, id)
+        self._indexed = {}   # (type, id) -> (its keys, its words), to update an entry in place
+        self._sorted_keys = []
+        self._sorted_words = []
+        self._lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._refreshing = False
+        self._db = None
+        if db_path:
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._init_db()
+            self._load_db()
+
+    # --- Slack API ---
+
+    def _get(self, method, params):
+        slack_token = os.environ.get("SLACK_API_KEY")
+        headers = {"Authorization": f"Bearer {slack_token}"}
+        response = rate_limited_request("slack", method, "GET", f"{SLACK_API_URL}/{method}",
+                                        headers=headers, params=params, timeout=30)
+        data = response.json()
+        if response.status_code != 200 or not data.get("ok"):
+            raise SlackDirectoryError(data.get("error", f"HTTP {response.status_code}"))
+        return data
+
+    def _paginate(self, method, key, params):
+        cursor = None
+        while True:
+            page_params = {**params, "limit": PAGE_SIZE}
+            if cursor:
+                page_params["cursor"] = cursor
+            data = self._get(method, page_params)
+            yield from data.get(key, [])
+            cursor = data.get("response_metadata", {}).get("next_cursor")
+            if not cursor:
+                return
+
+    # --- sync ---
+
+    def sync(self):
+        """
+        Pages through the workspace and applies the differences to the index.
+        Returns the number of users and channels that were added or changed.
+        """
+        with self._sync_lock:
+            return self._sync()
+
+    def _sync(self):
+        users = {}
+        for u in self._paginate("users.list", "members", {}):
+            if u.get("is_bot", False) or u.get("deleted", False) or u["id"] == "USLACKBOT":
+                continue
+            profile = u.get("profile", {})
+            users[u["id"]] = {
+                "id": u["id"],
+                "name": u.get("name"),
+                "real_name": u.get("real_name") or profile.get("real_name"),
+                "display_name": profile.get("display_name"),
+                "email": profile.get("email"),
+                "updated": u.get("updated", 0),
+            }
+        channels = {}
+        for ch in self._paginate("conversations.list", "channels",
+                                 {"types": "public_channel,private_channel", "exclude_archived": "true"}):
+            channels[ch["id"]] = {
+                "id": ch["id"],
+                "name": ch["name"],
+                "is_private": ch.get("is_private", False),
+                "updated": ch.get("updated", ch.get("created", 0)),
+            }
+
+        with self._lock:
+            changed_users = _changed(self.users, users)
+            changed_channels = _changed(self.channels, channels)
+            removed_users = self.users.keys() - users.keys()
+            removed_channels = self.channels.keys() - channels.keys()
+            self.users = users
+            self.channels = channels
+            self.synced_at = time.time()
+            for user_id in changed_users + list(removed_users):
+                self._index_entry(("user", user_id))
+            for channel_id in changed_channels + list(removed_channels):
+                self._index_entry(("channel", channel_id))
+        if self._db is not None:
+            self._save_db(changed_users, changed_channels, removed_users, removed_channels)
+        return len(changed_users) + len(changed_channels)
+
+    def ensure_fresh(self):
+        """
+        Blocks for the first sync; afterwards a stale directory keeps serving
+        lookups while it refreshes in a background thread.
+        """
+        if not self.synced_at:
+            with self._sync_lock:
+                # Concurrent first lookups wait for one sync instead of each running their own
+                if not self.synced_at:
+                    self._sync()
+            return
+        if time.time() - self.synced_at <= self.refresh_interval:
+            return
+        with self._refresh_lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+        threading.Thread(target=self._background_refresh, daemon=True).start()
+
+    def _background_refresh(self):
+        try:
+            self.sync()
+        except (requests.RequestException, SlackDirectoryError, RateLimited) as e:
+            # Keep serving the previous snapshot, but make a directory that stays stale visible
+            age = time.time() - self.synced_at
+            console.print(f"[bold yellow]Slack directory refresh failed[/bold yellow] "
+                          f"(snapshot is {age:.0f}s old): {e}")
+        finally:
+            with self._refresh_lock:
+                self._refreshing = False
+
+    # --- index ---
+
+    def _entry_values(self, entry):
+        kind, item_id = entry
+        if kind == "user":
+            user = self.users.get(item_id)
+            if user is None:
+                return ()
+            email = user.get("email") or ""
+            return (user["id"], user.get("name"), user.get("real_name"), user.get("display_name"),
+                    email, email.split("@")[0])
+        ch = self.channels.get(item_id)
+        return () if ch is None else (ch["id"], ch["name"])
+
+    def _index_entry(self, entry):
+        """
+        Replaces the index entries of one user or channel with its current
+        values (none once it was removed). Keys no longer used by anyone
+        leave the sorted lists; new keys are inserted in place.
+        """
+        old_keys, old_words = self._indexed.pop(entry, (set(), set()))
+        new_keys, new_words = set(), set()
+        for value in self._entry_values(entry):
+            _entry_keys(value, new_keys, new_words)
+        for index, ordered, old, new in ((self._keys, self._sorted_keys, old_keys, new_keys),
+                                         (self._words, self._sorted_words, old_words, new_words)):
+            for key in old - new:
+                entries = index[key]
+                entries.discard(entry)
+                if not entries:
+                    del index[key]
+                    del ordered[bisect.bisect_left(ordered, key)]
+            for key in new - old:
+                if key not in index:
+                    index[key] = set()
+                    bisect.insort(ordered, key)
+                index[key].add(entry)
+        if new_keys:
+            self._indexed[entry] = (new_keys, new_words)
+
+    def _reindex(self):
+        self._keys, self._words, self._indexed = {}, {}, {}
+        for entry in [("user", user_id) for user_id in self.users] + \
+                [("channel", channel_id) for channel_id in self.channels]:
+            keys, words = set(), set()
+            for value in self._entry_values(entry):
+                _entry_keys(value, keys, words)
+            for key in keys:
+                self._keys.setdefault(key, set()).add(entry)
+            for word in words:
+                self._words.setdefault(word, set()).add(entry)
+            if keys:
+                self._indexed[entry] = (keys, words)
+        self._sorted_keys, self._sorted_words = sorted(self._keys), sorted(self._words)
+
+    def resolve(self, query, kind="any", limit=5):
+        """
+        Best matches for a user/channel name, handle, email or ID.
+        Ranking: exact > prefix of a whole name > exact word (e.g. a surname)
+        > prefix of a word > fuzzy.
+        """
+        needle = _normalize(query.lstrip("#@"))
+        if not needle:
+            return []
+        with self._lock:
+            scores = {}
+
+            def add(index, key, score, how):
+                for entry in index.get(key, ()):
+                    if kind != "any" and entry[0] != kind:
+                        continue
+                    if entry not in scores or scores[entry][0] < score:
+                        scores[entry] = (score, how)
+
+            add(self._keys, needle, 1.0, "exact")
+            for key in _prefixed(self._sorted_keys, needle):
+                add(self._keys, key, 0.9, "prefix")
+            add(self._words, needle, 0.85, "word")
+            for word in _prefixed(self._sorted_words, needle):
+                add(self._words, word, 0.8, "prefix")
+            if len(scores) < limit:
+                for key in difflib.get_close_matches(needle, self._sorted_keys, n=limit * 2, cutoff=0.75):
+                    add(self._keys, key, round(0.75 * difflib.SequenceMatcher(None, needle, key).ratio(), 3), "fuzzy")
+
+            ranked = sorted(scores.items(), key=lambda item: -item[1][0])[:limit]
+            return [self._describe(entry, score, how) for entry, (score, how) in ranked]
+
+    def _describe(self, entry, score, how):
+        kind, item_id = entry
+        if kind == "user":
+            user = self.users[item_id]
+            match = {"type": "user", "id": item_id, "real_name": user.get("real_name"),
+                     "name": user.get("name"), "email": user.get("email")}
+        else:
+            ch = self.channels[item_id]
+            match = {"type": "channel", "id": item_id, "name": ch["name"], "is_private": ch["is_private"]}
+        match["match"] = how
+        match["score"] = score
+        return match
+
+    # --- SQLite persistence ---
+
+    def _init_db(self):
+        with self._db:
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS users (id TEXT PRIMARY KEY, name TEXT, real_name TEXT, "
+                "display_name TEXT, email TEXT, updated INTEGER)"
+            )
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS channels (id TEXT PRIMARY KEY, name TEXT, is_private INTEGER, "
+                "updated INTEGER)"
+            )
+            self._db.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+
+    def _load_db(self):
+        cursor = self._db.execute("SELECT id, name, real_name, display_name, email, updated FROM users")
+        self.users = {
+            row[0]: dict(zip(("id", "name", "real_name", "display_name", "email", "updated"), row))
+            for row in cursor
+        }
+        cursor = self._db.execute("SELECT id, name, is_private, updated FROM channels")
+        self.channels = {
+            row[0]: {"id": row[0], "name": row[1], "is_private": bool(row[2]), "updated": row[3]}
+            for row in cursor
+        }
+        row = self._db.execute("SELECT value FROM meta WHERE key = 'synced_at'").fetchone()
+        self.synced_at = float(row[0]) if row else 0.0
+        self._reindex()
+
+    def _save_db(self, changed_users, changed_channels, removed_users, removed_channels):
+        with self._lock, self._db:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO users VALUES (:id, :name, :real_name, :display_name, :email, :updated)",
+                [self.users[i] for i in changed_users],
+            )
+            self._db.executemany(
+                "INSERT OR REPLACE INTO channels VALUES (:id, :name, :is_private, :updated)",
+                [self.channels[i] for i in changed_channels],
+            )
+            self._db.executemany("DELETE FROM users WHERE id = ?", [(i,) for i in removed_users])
+            self._db.executemany("DELETE FROM channels WHERE id = ?", [(i,) for i in removed_channels])
+            self._db.execute(
+                "INSERT OR REPLACE INTO meta VALUES ('synced_at', ?)", (str(self.synced_at),)
+            )
+
+
+class SlackDirectoryError(Exception):
+    pass
+
+
+def _normalize(value):
+    return " ".join(str(value).split()).casefold()
+
+
+def _entry_keys(value, keys, words):
+    """
+    Adds the normalized key of a name/email/ID and, for multi-word values,
+    its single words.
+    """
+    if not value:
+        return
+    key = _normalize(value)
+    keys.add(key)
+    parts = re.split(r"[\s._-]+", key)
+    if len(parts) > 1:
+        words.update(word for word in parts if word)
+
+
+def _prefixed(sorted_keys, prefix):
+    start = bisect.bisect_left(sorted_keys, prefix)
+    for key in sorted_keys[start:]:
+        if not key.startswith(prefix):
+            return
+        yield key
+
+
+def _changed(old, new):
+    return [item_id for item_id, item in new.items() if old.get(item_id) != item]
+
+
+directory = SlackDirectory()
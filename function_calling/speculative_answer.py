@@ -0,0 +1,126 @@
+import os
+import time
+import asyncio
+import threading
+import httpx
+from llm_client import client
+from llm_scheduler import scheduler
+from tool_call_parser import ToolCallStreamParser
+
+# Generate a no-tool answer alongside structured tool selection when a backend slot is free (0 disables).
+# Trades extra Ollama compute for a faster reply on turns that need no tool.
+SPECULATIVE_ANSWER = os.environ.get("SPECULATIVE_ANSWER", "0") == "1"
+
+
+class SpeculationStats:
+    """
+    Outcome counters of speculative answers: started, used (streamed as the
+    reply), cancelled (selection chose a tool or failed), failed (request
+    error or a tool call in the answer), skipped (no free backend slot).
+    """
+
+    def __init__(self):
+        self.counts = {"started": 0, "used": 0, "cancelled": 0, "failed": 0, "skipped": 0}
+        self._lock = threading.Lock()
+
+    def inc(self, result):
+        with self._lock:
+            self.counts[result] += 1
+
+    def stats(self):
+        with self._lock:
+            return dict(self.counts)
+
+
+speculation_stats = SpeculationStats()
+
+
+class SpeculativeAnswer:
+    """
+    A direct answer generated in the background while tool selection runs.
+    Its text is buffered until selection has decided: stream() then replays
+    it and follows the rest of the generation; cancel() aborts it (closing the
+    stream stops the generation on Ollama) and frees its scheduler slot.
+    """
+
+    def __init__(self, data, ticket, trace):
+        self.text = ""
+        self.done = False
+        self.error = None
+        self.used = False
+        self.cancelled = False
+        self._trace = trace
+        self._changed = asyncio.Event()
+        self._task = asyncio.create_task(self._run(data))
+        # Also runs for a task cancelled before it started
+        self._task.add_done_callback(lambda _: scheduler.release(ticket))
+
+    async def _run(self, data):
+        parser = ToolCallStreamParser()
+        stats = None
+        first_chunk = None
+        requested = time.perf_counter()
+        stream = client.astream(data, endpoint="chat")
+        try:
+            async for chunk in stream:
+                if first_chunk is None:
+                    first_chunk = time.perf_counter()
+                if chunk.get("done"):
+                    stats = chunk
+                self.text += parser.feed(chunk.get("message", {}).get("content", ""))
+                if parser.mode == "tool":
+                    # The model wanted a tool after all; this is no direct answer
+                    self.error = "tool call in the direct answer"
+                    break
+                self._changed.set()
+            else:
+                self.text += parser.finish()
+        except httpx.HTTPError as e:
+            self.error = f"Request error: {e}"
+        finally:
+            await stream.aclose()
+            self._trace.generation("speculative", stats, requested, first_chunk, time.perf_counter())
+            self.done = True
+            self._changed.set()
+            if self.error:
+                speculation_stats.inc("failed")
+
+    async def stream(self):
+        """
+        Yields the answer so far each time it grows, until the generation ends.
+        """
+        self.used = True
+        speculation_stats.inc("used")
+        shown = None
+        while True:
+            if self.text and self.text != shown:
+                shown = self.text
+                yield shown
+            if self.done:
+                return
+            self._changed.clear()
+            await self._changed.wait()
+
+    def cancel(self):
+        """
+        Stops the generation if it is still running (no-op once it has ended).
+        """
+        if self._task.done() or self.cancelled:
+            return
+        self.cancelled = True
+        self._task.cancel()
+        if not self.used:
+            speculation_stats.inc("cancelled")
+
+
+def speculate(session, data, trace):
+    """
+    Starts a speculative answer for the request `data` if the scheduler has
+    a free slot right now, so it never delays other sessions; else None.
+    """
+    ticket = scheduler.try_admit(session, "speculative")
+    if ticket is None:
+        speculation_stats.inc("skipped")
+        return None
+    speculation_stats.inc("started")
+    return SpeculativeAnswer(data, ticket, trace)
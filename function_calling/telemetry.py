@@ -0,0 +1,201 @@
+import os
+import json
+import time
+import uuid
+import bisect
+import threading
+from contextlib import contextmanager
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# Port of the Prometheus /metrics endpoint started by the app (0 = disabled)
+METRICS_PORT = int(os.environ.get("METRICS_PORT", "9464"))
+# Optional JSONL file receiving one trace (all spans of a chat turn) per line
+TRACE_FILE = os.environ.get("TRACE_FILE", "")
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+# Span tags that become metric labels
+LABELS = ("stage", "llm", "tool", "cache", "status")
+
+
+def _label_value(value):
+    # Escapes required by the Prometheus text format
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _label_text(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_label_value(value)}"' for name, value in labels) + "}"
+
+
+class Metrics:
+    """
+    Minimal Prometheus-style registry: labelled histograms and counters,
+    plus gauges read from callbacks at scrape time. Thread-safe.
+    """
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.help = {}
+        self.histograms = {}  # name -> {labels: [bucket counts..., sum, count]}
+        self.counters = {}    # name -> {labels: value}
+        self.callbacks = {}   # name -> (type, fn() -> {labels tuple: value})
+        self._lock = threading.Lock()
+
+    def observe(self, name, value, help="", **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self.help.setdefault(name, help)
+            series = self.histograms.setdefault(name, {}).get(key)
+            if series is None:
+                series = self.histograms[name][key] = [0] * len(self.buckets) + [0.0, 0]
+            index = bisect.bisect_left(self.buckets, value)
+            if index < len(self.buckets):
+                series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def inc(self, name, value=1, help="", **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self.help.setdefault(name, help)
+            series = self.counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    def gauge(self, name, fn, help="", kind="gauge"):
+        """
+        Registers a metric read at scrape time: fn() returns {labels tuple: value}.
+        kind="counter" for totals kept elsewhere (e.g. tool cache counters).
+        """
+        self.help[name] = help
+        self.callbacks[name] = (kind, fn)
+
+    def render(self):
+        """
+        Prometheus text exposition format.
+        """
+        lines = []
+        with self._lock:
+            for name, series in self.histograms.items():
+                lines += [f"# HELP {name} {self.help.get(name, '')}", f"# TYPE {name} histogram"]
+                for labels, values in series.items():
+                    cumulative = 0
+                    for bound, count in zip(self.buckets, values):
+                        cumulative += count
+                        lines.append(f"{name}_bucket{_label_text(labels + (('le', bound),))} {cumulative}")
+                    lines.append(f"{name}_bucket{_label_text(labels + (('le', '+Inf'),))} {values[-1]}")
+                    lines.append(f"{name}_sum{_label_text(labels)} {values[-2]}")
+                    lines.append(f"{name}_count{_label_text(labels)} {values[-1]}")
+            for name, series in self.counters.items():
+                lines += [f"# HELP {name} {self.help.get(name, '')}", f"# TYPE {name} counter"]
+                lines += [f"{name}{_label_text(labels)} {value}" for labels, value in series.items()]
+        for name, (kind, fn) in self.callbacks.items():
+            lines += [f"# HELP {name} {self.help.get(name, '')}", f"# TYPE {name} {kind}"]
+            lines += [f"{name}{_label_text(labels)} {value}" for labels, value in fn().items()]
+        return "\n".join(lines) + "\n"
+
+
+metrics = Metrics()
+_trace_lock = threading.Lock()
+
+
+class Trace:
+    """
+    Spans of one chat turn. Each span has a name (the stage), a start offset
+    and a duration in seconds, and tags (llm stage, tool name, cache outcome,
+    token counts...). finish() feeds the spans into the histograms and, when
+    TRACE_FILE is set, appends the trace as one JSON line.
+    """
+
+    def __init__(self, session=None):
+        self.id = uuid.uuid4().hex[:16]
+        self.session = session
+        self.started_at = time.time()
+        self._t0 = time.perf_counter()
+        self.spans = []
+        self.tags = {}        # turn-level tags (e.g. outcome), labels of agent_turn_seconds
+
+    @contextmanager
+    def span(self, name, **tags):
+        start = time.perf_counter()
+        try:
+            yield tags
+        finally:
+            self.add(name, time.perf_counter() - start, start=start, **tags)
+
+    def add(self, name, duration, start=None, **tags):
+        if start is None:
+            start = time.perf_counter() - duration
+        # list.append is atomic, so tool threads can add spans too
+        self.spans.append({"name": name, "start": round(start - self._t0, 6), "duration": round(duration, 6), **tags})
+
+    def generation(self, llm, stats, requested, first_chunk, ended):
+        """
+        Records prefill/decode spans of one Ollama call, from its eval
+        counters when the final chunk arrived, otherwise from client-side
+        timing (e.g. when the stream was stopped early).
+        """
+        stats = stats or {}
+        if stats.get("load_duration"):
+            self.add("load", stats["load_duration"] / 1e9, llm=llm)
+        if "prompt_eval_duration" in stats or "eval_duration" in stats:
+            prefill = stats.get("prompt_eval_duration", 0) / 1e9
+            self.add("prefill", prefill, start=requested, llm=llm,
+                     tokens=stats.get("prompt_eval_count", 0), source="ollama")
+            self.add("decode", stats.get("eval_duration", 0) / 1e9, start=requested + prefill, llm=llm,
+                     tokens=stats.get("eval_count", 0), source="ollama")
+            return
+        first_chunk = first_chunk or ended
+        self.add("prefill", first_chunk - requested, start=requested, llm=llm, source="client")
+        self.add("decode", ended - first_chunk, start=first_chunk, llm=llm, source="client")
+
+    def stage_totals(self):
+        """
+        Seconds per stage summed over the spans, e.g. {"prefill/answer": 0.4, "tool/get_forecast": 0.2}.
+        """
+        totals = {}
+        for span in self.spans:
+            name = "/".join(filter(None, (span["name"], span.get("llm"), span.get("tool"))))
+            totals[name] = round(totals.get(name, 0.0) + span["duration"], 6)
+        return totals
+
+    def finish(self, **tags):
+        tags = {**self.tags, **tags}
+        total = time.perf_counter() - self._t0
+        for span in self.spans:
+            labels = {"stage": span["name"], **{k: span[k] for k in LABELS[1:] if k in span}}
+            metrics.observe("agent_stage_seconds", span["duration"], help="Duration of each turn stage", **labels)
+            if span.get("tokens"):
+                metrics.inc("agent_tokens_total", span["tokens"], help="Prompt (prefill) and completion (decode) tokens",
+                            stage=span["name"], llm=span.get("llm", ""))
+        metrics.observe("agent_turn_seconds", total, help="Duration of a whole chat turn", **tags)
+        if TRACE_FILE:
+            line = json.dumps({"trace": self.id, "session": self.session, "started_at": self.started_at,
+                               "duration": round(total, 6), **tags, "spans": self.spans})
+            with _trace_lock, open(TRACE_FILE, "a") as f:
+                f.write(line + "\n")
+
+
+def start_metrics_server(port=METRICS_PORT, host="127.0.0.1"):
+    """
+    Serves metrics.render() at http://host:port/metrics from a daemon thread.
+    """
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = metrics.render().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
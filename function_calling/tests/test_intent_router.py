@@ -0,0 +1,38 @@
+import pytest
+import tools
+from intent_router import IntentRouter
+
+
+def forecast(city):
+    return [{"name": "get_forecast", "arguments": {"city": city}}]
+
+
+@pytest.mark.parametrize("question, city", [
+    ("forecast for Paris", "Paris"),
+    ("What's the weather in New York today?", "New York"),
+    ("will it rain in London tomorrow", "London"),
+])
+def test_place_questions_are_routed(question, city):
+    assert IntentRouter().route(question) == forecast(city)
+
+
+@pytest.mark.parametrize("question", [
+    "forecast for it",
+    "weather in general",
+    "will it rain in the morning",
+    "weather for me",
+    "what's the weather in there?",
+    "weather in Celsius",
+    "weather for them tomorrow",
+    "forecast for London and Paris",
+])
+def test_non_places_fall_back_to_the_model(question):
+    router = IntentRouter()
+    assert router.route(question) is None
+    assert router.stats()["fallback"] == 1
+
+
+def test_ip_question_is_routed():
+    [call] = IntentRouter().route("Is 185.220.101.4 abusive?")
+    assert call["name"] == "check_ip_reputation"
+    assert call["arguments"]["ip_address"] == "185.220.101.4"
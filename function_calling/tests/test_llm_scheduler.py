@@ -0,0 +1,90 @@
+import asyncio
+import pytest
+from llm_scheduler import LLMScheduler, SchedulerBusy
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def granted_order(scheduler, tickets):
+    """
+    Releases the running tickets one by one and returns the order in which
+    `tickets` got the slot (the scheduler runs one generation at a time).
+    """
+    order = []
+    while len(order) < len(tickets):
+        running = next(iter(scheduler.active))
+        scheduler.release(running)
+        order += [t for t in tickets if t.granted.done() and t not in order]
+    return order
+
+
+def test_selection_goes_before_answers():
+    async def scenario():
+        scheduler = LLMScheduler(concurrency=1, deadline=float("inf"))
+        scheduler.admit("s0", "answer")
+        answer = scheduler.admit("s1", "answer")
+        select = scheduler.admit("s2", "select")
+        assert scheduler.position(select) == 1
+        assert granted_order(scheduler, [answer, select]) == [select, answer]
+    run(scenario())
+
+
+def test_aged_answer_is_promoted():
+    async def scenario():
+        scheduler = LLMScheduler(concurrency=1, deadline=float("inf"), aging=10)
+        scheduler.admit("s0", "answer")
+        answer = scheduler.admit("s1", "answer")
+        select = scheduler.admit("s2", "select")
+        answer.enqueued_at -= 11
+        assert granted_order(scheduler, [answer, select]) == [answer, select]
+    run(scenario())
+
+
+def test_busy_session_cannot_starve_others():
+    async def scenario():
+        scheduler = LLMScheduler(concurrency=1, deadline=float("inf"))
+        scheduler.admit("s0", "answer")
+        burst = [scheduler.admit("busy", "answer") for _ in range(3)]
+        other = scheduler.admit("other", "answer")
+        assert granted_order(scheduler, burst + [other]) == [burst[0], other, burst[1], burst[2]]
+    run(scenario())
+
+
+def test_busy_past_the_deadline():
+    async def scenario():
+        scheduler = LLMScheduler(concurrency=1, deadline=5)
+        scheduler.admit("s0", "answer")
+        with pytest.raises(SchedulerBusy) as busy:
+            scheduler.admit("s1", "answer")
+        assert busy.value.wait > 5
+        assert scheduler.stats()["rejected"] == 1
+        # A wait within the request's own deadline is queued
+        ticket = scheduler.admit("s1", "answer", deadline=60)
+        assert ticket in scheduler.waiting
+    run(scenario())
+
+
+def test_try_admit_only_with_a_free_slot():
+    async def scenario():
+        scheduler = LLMScheduler(concurrency=1)
+        first = scheduler.try_admit("s0", "speculative")
+        assert first is not None and first.granted.done()
+        assert scheduler.try_admit("s1", "speculative") is None
+        scheduler.release(first)
+        assert scheduler.try_admit("s1", "speculative") is not None
+    run(scenario())
+
+
+def test_release_of_a_queued_ticket_drops_it():
+    async def scenario():
+        scheduler = LLMScheduler(concurrency=1, deadline=float("inf"))
+        running = scheduler.admit("s0", "select")
+        queued = scheduler.admit("s1", "select")
+        scheduler.release(queued)
+        assert scheduler.waiting == []
+        scheduler.release(running)
+        assert not queued.granted.done()
+        assert scheduler.stats()["active"] == 0
+    run(scenario())
@@ -0,0 +1,22 @@
+import json
+from projection import fit_to_budget, render_result
+
+
+def test_dict_without_lists_is_truncated():
+    data = {"a": "x" * 100, "b": "y" * 100, "c": "z" * 100}
+    text = render_result(data, None, 20)
+    assert text.startswith('{"a":"xxx')
+    assert "…[truncated" in text
+
+
+def test_longest_list_is_shortened_with_a_note():
+    data = {"name": "scan", "reports": [{"ip": f"10.0.0.{i}", "score": i} for i in range(200)]}
+    text = fit_to_budget(data, 200)
+    fitted = json.loads(text)
+    assert fitted["name"] == "scan"
+    assert fitted["reports"][-1].endswith("more items omitted")
+    assert len(fitted["reports"]) < 200
+
+
+def test_small_result_is_unchanged():
+    assert fit_to_budget({"city": "Oslo", "temp": -3}, 100) == '{"city":"Oslo","temp":-3}'
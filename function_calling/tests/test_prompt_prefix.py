@@ -0,0 +1,91 @@
+import json
+import asyncio
+import pytest
+import Qwen_fc_app as app
+from context_window import new_context
+from telemetry import Trace
+
+HISTORY = [
+    {"role": "user", "content": "Hi, who are you?"},
+    {"role": "assistant", "content": "I can check IP reputation, the weather and post to Slack."},
+]
+TURNS = [
+    ("Is 185.220.101.4 abusive?",
+     [{"name": "check_ip_reputation", "arguments": {"ip_address": "185.220.101.4"}}],
+     {"name": "check_ip_reputation", "abuseConfidenceScore": 100, "reports": ["ssh brute force"] * 40},
+     "Yes, 185.220.101.4 is reported as abusive (score 100)."),
+    ("What's the forecast for Oslo?",
+     [{"name": "get_forecast", "arguments": {"city": "Oslo"}}],
+     {"name": "get_forecast", "city": "Oslo", "forecast": "light snow"},
+     "Light snow is expected in Oslo."),
+]
+
+
+def serialized(chat):
+    """
+    The messages as they go over the wire, so a prefix is checked byte for byte.
+    """
+    return json.dumps(chat, ensure_ascii=False)
+
+
+def assert_prefix(prefix, chat):
+    assert chat[:len(prefix)] == prefix
+    assert serialized(chat).startswith(serialized(prefix)[:-1])
+
+
+async def capture_answer(question, fn_responses, history, raw, context, monkeypatch):
+    sent = []
+
+    async def astream(data, endpoint="generate"):
+        sent.append(data["messages"])
+        yield {"message": {"content": "ok"}, "done": True}
+
+    monkeypatch.setattr(app.client, "astream", astream)
+    async for _ in app.answer_question(question, fn_responses, history, selection_raw=raw, context=context):
+        pass
+    return sent[0]
+
+
+def run_turn(question, calls, result, answer, messages, context, monkeypatch):
+    """
+    Builds the selection and answer chats of one tool-calling turn the way
+    run_turn does, and appends the turn to `messages`.
+    """
+    messages.append({"role": "user", "content": question})
+    select = app.selection_prompt(question, messages, context, Trace())
+    context["selection_chat"] = select
+    messages.append(app.tool_message(result["name"], result))
+    answer_chat = asyncio.run(capture_answer(
+        question, [result], messages.copy(), app.selection_reply(calls), context, monkeypatch))
+    messages.append({"role": "assistant", "content": answer})
+    return select, answer_chat
+
+
+@pytest.mark.parametrize("continuation", [True, False])
+@pytest.mark.parametrize("mode", ["text", "structured"])
+def test_turn_prefix_is_stable(mode, continuation, monkeypatch):
+    monkeypatch.setattr(app, "SELECTION_MODE", mode)
+    monkeypatch.setattr(app, "ANSWER_CONTINUATION", continuation)
+    context = new_context()
+    messages = list(HISTORY)
+    chats = [run_turn(*turn, messages, context, monkeypatch) for turn in TURNS]
+    (select_n, answer_n), (select_next, answer_next) = chats
+
+    # System message (instructions + tool definitions) and the history up to
+    # the question; only the stage instruction or the turn's own messages follow
+    stable = len(HISTORY) + 2
+    assert select_n[0]["role"] == "system"
+    assert select_n[stable - 1] == {"role": "user", "content": TURNS[0][0]}
+    prefix_n = select_n[:stable]
+
+    for chat in (select_next, answer_n, answer_next):
+        assert_prefix(prefix_n, chat)
+    assert_prefix(select_next[:stable + 3], answer_next)
+    if mode == "structured":
+        assert select_n[-1] == {"role": "system", "content": app.structured_selection_prompt.strip()}
+    else:
+        assert len(select_n) == stable
+    if continuation:
+        # The answer continues the exact chat the selection call sent
+        assert_prefix(select_n, answer_n)
+        assert_prefix(select_next, answer_next)
@@ -0,0 +1,138 @@
+import email.utils
+import pytest
+import rate_limit
+from rate_limit import Limit, RateLimiter, RateLimited, TokenBucket, per_second, per_day, DEFAULT_RETRY_AFTER
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+        self.epoch = 1_700_000_000.0
+        self.slept = []
+
+    def monotonic(self):
+        return self.now
+
+    def time(self):
+        return self.epoch + self.now
+
+    def sleep(self, seconds):
+        self.slept.append(seconds)
+        self.now += seconds
+
+
+class Response:
+    def __init__(self, status_code=200, **headers):
+        self.status_code = status_code
+        self.headers = {name.replace("_", "-"): value for name, value in headers.items()}
+
+
+class Api:
+    """
+    Stands in for requests.request, answering with the scripted responses in turn.
+    """
+
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.sent = 0
+
+    def request(self, method, url, **kwargs):
+        self.sent += 1
+        return self.responses.pop(0)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(rate_limit, "time", clock)
+    return clock
+
+
+def limiter(monkeypatch, limit, *responses, retries=2, max_wait=10):
+    api = Api(*responses)
+    monkeypatch.setattr(rate_limit, "requests", api)
+    return RateLimiter({("api", "*"): limit}, max_wait=max_wait, retries=retries), api
+
+
+def test_bucket_refills_up_to_capacity(clock):
+    bucket = TokenBucket("second", rate=2, capacity=3)
+    bucket.tokens = 0
+    clock.now += 0.25
+    bucket.refill(clock.now)
+    assert bucket.tokens == 0.5
+    assert bucket.wait() == 0.25
+    clock.now += 60
+    bucket.refill(clock.now)
+    assert bucket.tokens == 3
+
+
+def test_reservations_queue_behind_each_other(clock):
+    limit = Limit("api", "*", per_second(1, burst=2))
+    assert [limit.reserve(10) for _ in range(4)] == [0.0, 0.0, 1.0, 2.0]
+    assert limit.stats()["waited"] == 2
+
+
+def test_wait_past_max_wait_is_rejected_without_taking_a_slot(clock):
+    limit = Limit("api", "*", per_second(1, burst=1))
+    limit.reserve(10)
+    with pytest.raises(RateLimited) as rejected:
+        limit.reserve(0.5)
+    assert rejected.value.retry_after == 1.0
+    assert rejected.value.result()["error"] == "rate_limited"
+    assert limit.reserve(1) == 1.0      # the rejected call took nothing
+    assert limit.stats()["rejected"] == 1
+
+
+def test_strictest_bucket_decides(clock):
+    limit = Limit("api", "*", per_second(10), per_day(2))
+    limit.reserve(10)
+    limit.reserve(10)
+    with pytest.raises(RateLimited):
+        limit.reserve(60)
+
+
+@pytest.mark.parametrize("headers, blocked", [
+    ({"Retry_After": "5"}, 5.0),
+    ({"Retry_After": email.utils.formatdate(1_700_000_000.0 + 1000.0 + 30, usegmt=True)}, 30.0),
+    ({}, DEFAULT_RETRY_AFTER),
+])
+def test_429_blocks_for_retry_after(clock, headers, blocked):
+    limit = Limit("api", "*", per_second(10))
+    limit.update(Response(429, **headers))
+    assert limit.reserve(60) == pytest.approx(blocked)
+    assert limit.stats()["throttled"] == 1
+
+
+def test_remaining_header_caps_the_quota(clock):
+    limit = Limit("api", "*", per_second(10), per_day(1000))
+    limit.update(Response(200, X_RateLimit_Remaining="1"))
+    limit.reserve(10)
+    with pytest.raises(RateLimited):
+        limit.reserve(60)
+
+
+def test_request_retries_after_a_429(clock, monkeypatch):
+    rate_limiter, api = limiter(monkeypatch, Limit("api", "*", per_second(10)),
+                                Response(429, Retry_After="2"), Response(200))
+    response = rate_limiter.request("api", "check", "GET", "https://api.test/check")
+    assert response.status_code == 200
+    assert api.sent == 2
+    assert sum(clock.slept) == pytest.approx(2)
+
+
+def test_request_gives_up_after_the_retries(clock, monkeypatch):
+    rate_limiter, api = limiter(monkeypatch, Limit("api", "*", per_second(10)),
+                                *[Response(429, Retry_After="1")] * 3, retries=2)
+    with pytest.raises(RateLimited) as throttled:
+        rate_limiter.request("api", "check", "GET", "https://api.test/check")
+    assert api.sent == 3
+    assert throttled.value.retry_after == 1.0
+
+
+def test_retry_after_past_the_deadline_is_not_awaited(clock, monkeypatch):
+    rate_limiter, api = limiter(monkeypatch, Limit("api", "*", per_second(10)),
+                                Response(429, Retry_After="30"), Response(200), max_wait=10)
+    with pytest.raises(RateLimited):
+        rate_limiter.request("api", "check", "GET", "https://api.test/check")
+    assert api.sent == 1
+    assert sum(clock.slept) == 0
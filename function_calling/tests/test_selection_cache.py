@@ -0,0 +1,78 @@
+import tools
+from registry import registry, definitions
+from selection_cache import SelectionCache
+
+NAMES = registry.names(definitions)
+
+
+def forecast(city):
+    return [{"name": "get_forecast", "arguments": {"city": city}}]
+
+
+def resolve(query):
+    return [{"name": "resolve_slack_recipient", "arguments": {"query": query}}]
+
+
+def user(text):
+    return {"role": "user", "content": text}
+
+
+def assistant(text):
+    return {"role": "assistant", "content": text}
+
+
+def store(cache, question, calls, history=()):
+    cache.store(question, [*history, user(question)], NAMES, calls, 1.0)
+
+
+def lookup(cache, question, history=()):
+    return cache.lookup(question, [*history, user(question)], NAMES)
+
+
+def test_plain_words_are_not_generalized():
+    cache = SelectionCache()
+    store(cache, "What's the weather in London?", forecast("London"))
+    assert lookup(cache, "what's the weather in London") == forecast("London")
+    assert lookup(cache, "What's the weather in Paris?") is None
+    for qualifier in ("Celsius", "brief", "detail", "general"):
+        assert lookup(cache, f"What's the weather in {qualifier}?") is None
+
+
+def test_plain_words_never_become_a_query():
+    cache = SelectionCache()
+    store(cache, "find alice on slack", resolve("alice"))
+    assert lookup(cache, "find channels on slack") is None
+    assert lookup(cache, "find me on slack") is None
+
+
+def test_typed_slot_generalizes_an_ip():
+    cache = SelectionCache()
+    calls = [{"name": "check_ip_reputation", "arguments": {"ip_address": "1.2.3.4"}}]
+    store(cache, "Is 1.2.3.4 abused?", calls)
+    assert lookup(cache, "is 5.6.7.8 abused") == [{"name": "check_ip_reputation", "arguments": {"ip_address": "5.6.7.8"}}]
+
+
+def test_typed_slot_must_come_from_the_arguments():
+    cache = SelectionCache()
+    # The model ignored the number: another one must not reuse the decision
+    store(cache, "forecast for Oslo in 3 days", forecast("Oslo"))
+    assert lookup(cache, "forecast for Oslo in 5 days") is None
+    assert lookup(cache, "forecast for Oslo in 3 days") is None
+
+
+def test_key_includes_the_previous_reply():
+    cache = SelectionCache()
+    first = [user("Which city had the most snow?"), assistant("Oslo had the most snow.")]
+    other = [user("Which city had the most snow?"), assistant("Helsinki had the most snow.")]
+    store(cache, "and the forecast there?", forecast("Oslo"), first)
+    assert lookup(cache, "and the forecast there?", first) == forecast("Oslo")
+    assert lookup(cache, "and the forecast there?", other) is None
+    assert lookup(cache, "and the forecast there?") is None
+
+
+def test_side_effecting_calls_are_not_cached():
+    cache = SelectionCache()
+    calls = [{"name": "send_slack_message", "arguments": {"channel": "#ops", "message": "hi"}}]
+    store(cache, "say hi in #ops", calls)
+    assert lookup(cache, "say hi in #ops") is None
+    assert cache.stats()["bypassed"] == 1
@@ -0,0 +1,19 @@
+import time
+import tools
+from executor import record_tool_span
+from telemetry import Metrics, Trace
+
+
+def test_label_values_are_escaped():
+    metrics = Metrics()
+    metrics.inc("agent_test_total", tool='bad"name\nx\\y')
+    lines = metrics.render().splitlines()
+    assert 'agent_test_total{tool="bad\\"name\\nx\\\\y"} 1' in lines
+    assert all(line.startswith(("#", "agent_test_total")) for line in lines if line)
+
+
+def test_unregistered_tool_names_are_not_labels():
+    trace = Trace()
+    for name in ("get_forecast", 'made_up"tool\n'):
+        record_tool_span(trace, {"name": name, "arguments": {}}, time.perf_counter(), {"ok": True}, None)
+    assert [span["tool"] for span in trace.spans] == ["get_forecast", "unknown"]
@@ -0,0 +1,135 @@
+import time
+import threading
+import pytest
+import tool_cache
+from tool_cache import ToolCache, CachePolicy, cached_tool, canonical_ip, last_outcome
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(tool_cache, "time", clock)
+    return clock
+
+
+def counting(results=None):
+    calls = []
+
+    def fn(**arguments):
+        calls.append(arguments)
+        return (results or {}).get(arguments.get("q"), {"q": arguments.get("q"), "n": len(calls)})
+    return fn, calls
+
+
+def test_ttl_expiry(clock):
+    cache = ToolCache("t", CachePolicy(ttl=60))
+    fn, calls = counting()
+    first = cache.call(fn, {"q": "a"})
+    assert last_outcome() == "miss"
+    clock.now += 59
+    assert cache.call(fn, {"q": "a"}) is first
+    assert last_outcome() == "hit"
+    clock.now += 2
+    assert cache.call(fn, {"q": "a"}) == {"q": "a", "n": 2}
+    assert len(calls) == 2
+
+
+def test_lru_eviction(clock):
+    cache = ToolCache("t", CachePolicy(ttl=60, max_entries=2))
+    fn, calls = counting()
+    for q in ("a", "b", "a", "c"):
+        cache.call(fn, {"q": q})
+    assert cache.stats()["size"] == 2
+    cache.call(fn, {"q": "a"})   # used recently: kept
+    cache.call(fn, {"q": "b"})   # least recently used: evicted by "c"
+    assert [call["q"] for call in calls] == ["a", "b", "c", "b"]
+
+
+def test_error_results_are_not_cached(clock):
+    cache = ToolCache("t", CachePolicy(ttl=60))
+    fn, calls = counting({"bad": {"status": "error", "error": "upstream"}})
+    cache.call(fn, {"q": "bad"})
+    cache.call(fn, {"q": "bad"})
+    assert len(calls) == 2
+
+
+def test_concurrent_identical_calls_share_one_request():
+    cache = ToolCache("t", CachePolicy(ttl=60))
+    release = threading.Event()
+    calls = []
+
+    def fn(q):
+        calls.append(q)
+        release.wait(5)
+        return {"q": q}
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.call(fn, {"q": "a"}))) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    deadline = time.monotonic() + 5
+    while cache.stats()["coalesced"] < 7 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    release.set()
+    for thread in threads:
+        thread.join()
+    assert calls == ["a"]
+    assert results == [{"q": "a"}] * 8
+    assert cache.stats()["misses"] == 1 and cache.stats()["coalesced"] == 7
+
+
+def test_waiters_share_the_leaders_exception():
+    cache = ToolCache("t", CachePolicy(ttl=60))
+    started = threading.Event()
+    release = threading.Event()
+
+    def fn(q):
+        started.set()
+        release.wait(5)
+        raise ValueError("upstream down")
+
+    errors = []
+
+    def call():
+        try:
+            cache.call(fn, {"q": "a"})
+        except ValueError as e:
+            errors.append(e)
+
+    leader = threading.Thread(target=call)
+    leader.start()
+    started.wait(5)
+    waiter = threading.Thread(target=call)
+    waiter.start()
+    deadline = time.monotonic() + 5
+    while cache.stats()["coalesced"] < 1 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    release.set()
+    leader.join()
+    waiter.join()
+    assert len(errors) == 2 and errors[0] is errors[1]
+    assert cache.stats()["size"] == 0
+
+
+def test_equivalent_arguments_share_an_entry(clock, monkeypatch):
+    monkeypatch.setattr(tool_cache, "caches", {})
+    fn, calls = counting()
+
+    def lookup(ip, max_age=90):
+        return fn(q=ip, max_age=max_age)
+
+    cached = cached_tool("test_lookup", lookup, CachePolicy(ttl=60, normalize={"ip": canonical_ip}))
+    cached(" 2001:DB8::1")
+    cached("2001:db8:0::1", max_age=90)
+    cached(ip="2001:db8::1")
+    assert len(calls) == 1
+    cached("2001:db8::1", max_age=30)
+    assert len(calls) == 2
@@ -0,0 +1,146 @@
+import json
+import pytest
+from tool_call_parser import ToolCallStreamParser, parse_structured_selection
+
+CALLS = [{"name": "send_slack_message", "arguments": {"channel": "#ops", "text": "a \"quoted\" ] } [ { text\\"}}]
+
+
+def feed_all(chunks):
+    parser = ToolCallStreamParser()
+    released = "".join(parser.feed(chunk) for chunk in chunks)
+    if not parser.done:
+        released += parser.finish()
+    return parser, released
+
+
+def splits(text):
+    """
+    Every way to cut `text` into two chunks, plus one character per chunk.
+    """
+    for i in range(len(text) + 1):
+        yield [text[:i], text[i:]]
+    yield list(text)
+
+
+@pytest.mark.parametrize("prefix", ["[TOOL_CALLS] ", "", "```json\n", "[TOOL_CALLS]"])
+def test_tool_call_array_any_chunk_split(prefix):
+    raw = prefix + json.dumps(CALLS) + "\nextra text after the call"
+    for chunks in splits(raw):
+        parser, released = feed_all(chunks)
+        assert parser.mode == "tool"
+        assert parser.done
+        assert parser.calls == CALLS
+        assert released == ""
+
+
+def test_split_inside_escape_sequence():
+    array = json.dumps(CALLS)
+    escape = array.index("\\\\")
+    parser, _ = feed_all([array[:escape + 1], array[escape + 1:]])
+    assert parser.calls == CALLS
+
+
+def test_brackets_in_strings_do_not_close_the_array():
+    parser = ToolCallStreamParser()
+    array = json.dumps(CALLS)
+    closing = array.index("]")   # inside the "text" string
+    parser.feed(array[:closing + 1])
+    assert not parser.done
+    parser.feed(array[closing + 1:])
+    assert parser.done and parser.calls == CALLS
+
+
+def test_preamble_text_is_released_before_the_call():
+    preamble = "Let me check that for you. "
+    raw = preamble + "[TOOL_CALLS] " + json.dumps(CALLS)
+    for chunks in splits(raw):
+        parser, released = feed_all(chunks)
+        assert parser.calls == CALLS
+        assert released == preamble
+        assert parser.text == preamble
+
+
+def test_preamble_before_a_bare_array():
+    preamble = "Sure: "
+    parser, released = feed_all([preamble, json.dumps(CALLS)[:5], json.dumps(CALLS)[5:]])
+    assert parser.calls == CALLS
+    assert released == preamble
+
+
+@pytest.mark.parametrize("answer", [
+    "The forecast for Paris is sunny.",
+    "Use [brackets] sparingly.",
+    "[1, 2, 3] is a list.",
+    "Ends with an open bracket [",
+])
+def test_plain_text_is_streamed_unchanged(answer):
+    for chunks in splits(answer):
+        parser, released = feed_all(chunks)
+        assert parser.mode == "text"
+        assert parser.calls is None
+        assert released == answer
+
+
+def test_partial_marker_is_held_back():
+    parser = ToolCallStreamParser()
+    assert parser.feed("Checking [TOOL_") == "Checking "
+    assert parser.feed("CALLS] ") == ""
+    parser.feed(json.dumps(CALLS))
+    assert parser.calls == CALLS
+
+
+@pytest.mark.parametrize("array", [
+    '[{"name": "get_forecast", "arguments": {"city": "Paris"},}]',   # trailing comma
+    '[{"arguments": {"city": "Paris"}}]',                            # no name
+    '[{"name": "get_forecast"}, 3]',                                 # not an object
+])
+def test_malformed_array_gives_no_calls(array):
+    parser, released = feed_all(["[TOOL_CALLS] ", array])
+    assert parser.done
+    assert parser.calls is None
+    assert released == ""
+
+
+def test_unterminated_array_falls_back_to_text():
+    raw = '[TOOL_CALLS] [{"name": "get_forecast", "arguments": {"city": "Par'
+    parser, released = feed_all([raw[:20], raw[20:]])
+    assert not parser.done
+    assert parser.mode == "text"
+    assert parser.calls is None
+    assert released == raw
+
+
+def test_bare_object_after_the_marker_is_one_call():
+    raw = '[TOOL_CALLS] {"name": "get_forecast", "arguments": {"city": "Oslo {north}"}} done'
+    for chunks in splits(raw):
+        parser, released = feed_all(chunks)
+        assert parser.done
+        assert parser.calls == [{"name": "get_forecast", "arguments": {"city": "Oslo {north}"}}]
+        assert released == ""
+
+
+def test_bare_object_without_the_marker_is_text():
+    answer = '{"city": "Oslo"} is the JSON you asked for.'
+    parser, released = feed_all([answer])
+    assert parser.calls is None
+    assert released == answer
+
+
+def test_nothing_is_accepted_after_the_array():
+    parser = ToolCallStreamParser()
+    parser.feed(json.dumps(CALLS))
+    assert parser.feed("more text") == ""
+    assert parser.finish() == ""
+
+
+@pytest.mark.parametrize("raw, expected", [
+    ('{"tool_calls": [{"name": "get_forecast", "arguments": {"city": "Oslo"}}], "answer": ""}',
+     ("", [{"name": "get_forecast", "arguments": {"city": "Oslo"}}], [])),
+    ('{"tool_calls": [], "answer": "Hello!"}', ("Hello!", None, [])),
+    ('{"tool_calls": [], "answer": " "}', ("", None, ["either 'tool_calls' or 'answer' must be filled in"])),
+    ('{"tool_calls": {"name": "x"}}', ("", None, ["'tool_calls' must be a list"])),
+    ('[]', ("", None, ["reply must be a JSON object"])),
+    ('{"tool_calls": [', ("", None, ["reply is not valid JSON"])),
+])
+def test_parse_structured_selection(raw, expected):
+    assert parse_structured_selection(raw) == expected
@@ -0,0 +1,203 @@
+import json
+import time
+import inspect
+import ipaddress
+import threading
+import functools
+from collections import OrderedDict
+
+# name -> ToolCache, for stats
+caches = {}
+# Outcome of the latest cached call on this thread ("hit", "miss" or "coalesced")
+_local = threading.local()
+
+
+def clear_outcome():
+    _local.outcome = None
+
+
+def last_outcome():
+    return getattr(_local, "outcome", None)
+
+
+class CachePolicy:
+    """
+    How a read-only tool's results are cached.
+    ttl: seconds a result stays fresh; max_entries: LRU bound;
+    normalize: {argument name: function} applied to argument values before they
+    form the cache key (e.g. canonical_ip), so equivalent calls share an entry.
+    """
+
+    def __init__(self, ttl, max_entries=1024, normalize=None):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.normalize = normalize or {}
+
+
+# --- key normalizers ---
+
+def canonical_ip(value):
+    """
+    Canonical text form of an IP address or network, so " 1.2.3.4" and "1.2.3.4",
+    or "2001:DB8::1" and "2001:db8:0::1", share a cache entry.
+    """
+    text = str(value).strip()
+    try:
+        if "/" in text:
+            return str(ipaddress.ip_network(text, strict=False))
+        return str(ipaddress.ip_address(text))
+    except ValueError:
+        return text.lower()
+
+
+def rounded(ndigits):
+    """
+    Rounds coordinates so nearby points share a cache entry (2 digits ~ 1 km).
+    """
+    def normalize(value):
+        try:
+            return round(float(value), ndigits)
+        except (TypeError, ValueError):
+            return value
+    return normalize
+
+
+def casefold(value):
+    return " ".join(str(value).split()).casefold()
+
+
+def is_cacheable(result):
+    """
+    Error results (Slack/registry style status errors, AbuseIPDB "errors",
+    OpenWeather non-200 "cod") are never cached.
+    """
+    data = result
+    if isinstance(result, str):
+        try:
+            data = json.loads(result)
+        except ValueError:
+            return False
+    if not isinstance(data, dict):
+        return True
+    if data.get("status") == "error" or "errors" in data:
+        return False
+    return str(data.get("cod", "200")) == "200"
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class ToolCache:
+    """
+    Thread-safe TTL + LRU cache with single-flight coalescing: concurrent calls
+    with the same key wait for the one in-flight request instead of each
+    hitting the remote API.
+    """
+
+    def __init__(self, name, policy):
+        self.name = name
+        self.policy = policy
+        self._entries = OrderedDict()  # key -> (expires_at, result)
+        self._in_flight = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    def key(self, arguments):
+        normalize = self.policy.normalize
+        return json.dumps(
+            {name: normalize[name](value) if name in normalize else value
+             for name, value in arguments.items()},
+            sort_keys=True, default=str
+        )
+
+    def call(self, fn, arguments):
+        key = self.key(arguments)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    _local.outcome = "hit"
+                    return entry[1]
+                del self._entries[key]
+            flight = self._in_flight.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._in_flight[key] = _Flight()
+                self.misses += 1
+            else:
+                self.coalesced += 1
+            _local.outcome = "miss" if leader else "coalesced"
+
+        if not leader:
+            flight.done.wait()
+            if isinstance(flight.error, Exception):
+                raise flight.error
+            if flight.error is not None:
+                # The leader was interrupted (cancelled, KeyboardInterrupt): fail this call like a tool error
+                raise RuntimeError(f"{self.name}: shared call was interrupted ({type(flight.error).__name__})")
+            return flight.result
+
+        try:
+            flight.result = fn(**arguments)
+        except BaseException as e:
+            # Any exit without a result is recorded, so nothing (no None) is cached or shared
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                if flight.error is None and is_cacheable(flight.result):
+                    self._entries[key] = (time.monotonic() + self.policy.ttl, flight.result)
+                    self._entries.move_to_end(key)
+                    while len(self._entries) > self.policy.max_entries:
+                        self._entries.popitem(last=False)
+                del self._in_flight[key]
+            flight.done.set()
+        return flight.result
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses + self.coalesced
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "hit_rate": (self.hits + self.coalesced) / lookups if lookups else 0.0,
+                "size": len(self._entries),
+            }
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+def cached_tool(name, fn, policy):
+    """
+    Wraps a tool function with a ToolCache. Arguments are bound to the function
+    signature (defaults applied) so f(ip) and f(ip, max_age=90) share an entry.
+    """
+    cache = caches[name] = ToolCache(name, policy)
+    signature = inspect.signature(fn)
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        bound = signature.bind(*args, **kwargs)
+        bound.apply_defaults()
+        return cache.call(fn, dict(bound.arguments))
+
+    wrapper.cache = cache
+    return wrapper
+
+
+def cache_stats():
+    """
+    Hit/miss counters for every cached tool, keyed by tool name.
+    """
+    return {name: cache.stats() for name, cache in caches.items()}
@@ -0,0 +1,199 @@
+import json
+
+TOOL_CALLS_MARKER = "[TOOL_CALLS]"
+CODE_FENCES = ("```json", "```")
+
+
+class ToolCallStreamParser:
+    """
+    Incremental parser for the selection stage's streamed output.
+    Decides as early as possible whether the model is emitting a tool call
+    ("[TOOL_CALLS] [ ... ]", "[TOOL_CALLS] {...}" for a single call, or a bare
+    "[{...}]" array) or answering in plain
+    text. Plain text is released for streaming to the user (holding back
+    anything that could still turn into the marker); a tool-call array is
+    bracket-matched as it arrives so the caller can stop the generation as
+    soon as its closing bracket is seen.
+    """
+
+    def __init__(self):
+        self.buffer = ""
+        self.mode = None          # None (undecided), "text" or "tool"
+        self.calls = None         # parsed tool calls once complete
+        self.done = False         # True once the tool-call array is complete
+        self.text_end = 0         # buffer[:text_end] is text already released
+        self._array_start = None
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+
+    def feed(self, chunk):
+        """
+        Adds streamed text. Returns the new plain text that can be shown to
+        the user ("" while undecided, in tool mode, or when held back); text
+        arriving in the same chunk as the start of a tool call is returned too.
+        """
+        if self.done:
+            return ""
+        self.buffer += chunk
+        if self.mode is None:
+            self._decide()
+        released = ""
+        if self.mode == "text":
+            start = self._find_tool_start(self.text_end)
+            if start is None:
+                return self._release_text()
+            released = self.buffer[self.text_end:start]
+            self.text_end = start
+            self._enter_tool(start)
+        if self.mode == "tool":
+            self._scan()
+        return released
+
+    def finish(self):
+        """
+        Called when the stream ends. Returns any held-back plain text.
+        """
+        if self.mode == "tool" and not self.done:
+            # Unterminated array: treat what we have as text
+            self.mode = "text"
+        if self.mode != "tool":
+            self.mode = "text"
+            released = self.buffer[self.text_end:]
+            self.text_end = len(self.buffer)
+            return released
+        return ""
+
+    @property
+    def text(self):
+        """
+        Plain text emitted before any tool call.
+        """
+        return self.buffer[:self.text_end]
+
+    def _decide(self):
+        head = self.buffer.lstrip()
+        for fence in CODE_FENCES:
+            if head.startswith(fence):
+                head = head[len(fence):].lstrip()
+                break
+            if fence.startswith(head):
+                return  # could still be a code fence
+        if not head:
+            return
+        start = len(self.buffer) - len(head)
+        if head.startswith(TOOL_CALLS_MARKER):
+            self._enter_tool(start)
+        elif head.startswith("["):
+            rest = head[1:].lstrip()
+            if rest.startswith("{"):
+                self._enter_tool(start)
+            elif rest and not TOOL_CALLS_MARKER.startswith(head):
+                self.mode = "text"
+        else:
+            self.mode = "text"
+
+    def _find_tool_start(self, offset):
+        marker = self.buffer.find(TOOL_CALLS_MARKER, offset)
+        bracket = offset
+        while True:
+            bracket = self.buffer.find("[", bracket)
+            if bracket == -1:
+                break
+            rest = self.buffer[bracket + 1:].lstrip()
+            if rest.startswith("{"):
+                break
+            bracket += 1
+        candidates = [i for i in (marker, bracket) if i != -1]
+        return min(candidates) if candidates else None
+
+    def _enter_tool(self, start):
+        self.mode = "tool"
+        if self.buffer.startswith(TOOL_CALLS_MARKER, start):
+            start = self._find_open(start + len(TOOL_CALLS_MARKER))
+            if start == -1:
+                # Marker seen but the array has not started yet
+                self._array_start = None
+                self._pos = len(self.buffer)
+                return
+        self._array_start = start
+        self._pos = start
+
+    def _find_open(self, offset):
+        # After the marker the calls are an array or, for a single call, an object
+        found = [i for i in (self.buffer.find("[", offset), self.buffer.find("{", offset)) if i != -1]
+        return min(found) if found else -1
+
+    def _release_text(self):
+        end = len(self.buffer)
+        # Hold back a trailing "[" or partial marker until we know what it is
+        tail_start = self.buffer.rfind("[", self.text_end)
+        if tail_start != -1:
+            tail = self.buffer[tail_start:]
+            if TOOL_CALLS_MARKER.startswith(tail) or not tail[1:].strip():
+                end = tail_start
+        released = self.buffer[self.text_end:end]
+        self.text_end = end
+        return released
+
+    def _scan(self):
+        if self._array_start is None:
+            start = self._find_open(self._pos)
+            if start == -1:
+                return
+            self._array_start = self._pos = start
+        buffer = self.buffer
+        for i in range(self._pos, len(buffer)):
+            ch = buffer[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+            elif ch == '"':
+                self._in_string = True
+            elif ch in "[{":
+                self._depth += 1
+            elif ch in "]}":
+                self._depth -= 1
+                if self._depth == 0:
+                    self._complete(buffer[self._array_start:i + 1])
+                    return
+        self._pos = len(buffer)
+
+    def _complete(self, array_text):
+        self.done = True
+        try:
+            calls = json.loads(array_text)
+        except ValueError:
+            calls = None
+        if isinstance(calls, dict):
+            calls = [calls]
+        if not isinstance(calls, list) or not all(isinstance(c, dict) and "name" in c for c in calls):
+            calls = None
+        self.calls = calls
+
+
+def parse_structured_selection(raw):
+    """
+    Parses a schema-constrained selection reply ({"tool_calls": [...], "answer": "..."}).
+    Returns (answer text, tool calls or None, list of problems).
+    """
+    try:
+        reply = json.loads(raw)
+    except ValueError:
+        return "", None, ["reply is not valid JSON"]
+    if not isinstance(reply, dict):
+        return "", None, ["reply must be a JSON object"]
+    calls = reply.get("tool_calls") or None
+    answer = reply.get("answer")
+    if calls is not None and not isinstance(calls, list):
+        return "", None, ["'tool_calls' must be a list"]
+    if not isinstance(answer, str):
+        answer = ""
+    if not calls and not answer.strip():
+        return "", None, ["either 'tool_calls' or 'answer' must be filled in"]
+    return answer, calls, []
@@ -0,0 +1,120 @@
+import os
+import re
+import math
+import ipaddress
+from collections import Counter
+
+# Below this many registered tools every definition is sent (keeps the system prompt stable)
+ROUTER_MIN_TOOLS = int(os.environ.get("ROUTER_MIN_TOOLS", "12"))
+ROUTER_TOP_K = int(os.environ.get("ROUTER_TOP_K", "5"))
+# Best BM25 score below which the router is not confident and sends every definition
+ROUTER_MIN_SCORE = float(os.environ.get("ROUTER_MIN_SCORE", "1.0"))
+# How many recent messages are checked for tools already in use
+ROUTER_HISTORY_MESSAGES = 6
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+STOPWORDS = {
+    "a", "an", "and", "the", "of", "to", "in", "on", "for", "is", "are", "be", "by", "at",
+    "or", "any", "all", "if", "it", "this", "that", "with", "get", "e", "g", "eg", "how",
+    "what", "can", "you", "me", "my", "i", "please", "has", "have", "been", "was",
+}
+
+
+def mentions_ip(text):
+    for candidate in re.findall(r"[0-9A-Fa-f:.]*[:.][0-9A-Fa-f:.]*(?:/\d{1,3})?", text):
+        try:
+            ipaddress.ip_network(candidate.rstrip(".:"), strict=False)
+            return True
+        except ValueError:
+            continue
+    return False
+
+
+def tokenize(text):
+    tokens = []
+    if mentions_ip(str(text)):
+        # Addresses themselves carry no vocabulary; mark that an IP was mentioned
+        tokens.append("ip")
+    for token in re.findall(r"[a-z0-9]+", str(text).lower()):
+        if token in STOPWORDS:
+            continue
+        # Light stemming so "abused"/"abuse"/"abusive", "channels"/"channel" meet
+        for suffix in ("ing", "ive", "ed", "es", "s", "e"):
+            if token.endswith(suffix) and len(token) - len(suffix) >= 3:
+                token = token[:-len(suffix)]
+                break
+        tokens.append(token)
+    return tokens
+
+
+def definition_text(definition):
+    fn = definition.get("function", definition)
+    parts = [fn.get("name", "").replace("_", " "), fn.get("description", "")]
+    for name, prop in fn.get("parameters", {}).get("properties", {}).items():
+        parts += [name.replace("_", " "), prop.get("description", "")]
+    return " ".join(parts)
+
+
+class ToolRouter:
+    """
+    BM25 index over tool names, descriptions and parameter names.
+    Built once per registry size (tools are only ever appended) and used to send
+    just the top-k relevant definitions plus tools already used in recent history.
+    """
+
+    def __init__(self):
+        self._indexed = -1
+        self._docs = []
+        self._df = Counter()
+        self._avg_len = 0.0
+
+    def _build(self, definitions):
+        self._docs = [Counter(tokenize(definition_text(d))) for d in definitions]
+        self._df = Counter(token for doc in self._docs for token in doc)
+        self._avg_len = sum(sum(doc.values()) for doc in self._docs) / max(len(self._docs), 1)
+        self._indexed = len(definitions)
+
+    def scores(self, query, definitions):
+        if self._indexed != len(definitions):
+            self._build(definitions)
+        n = len(self._docs)
+        terms = set(tokenize(query))
+        scores = []
+        for doc in self._docs:
+            length = sum(doc.values())
+            score = 0.0
+            for term in terms:
+                tf = doc.get(term, 0)
+                if not tf:
+                    continue
+                idf = math.log(1 + (n - self._df[term] + 0.5) / (self._df[term] + 0.5))
+                score += idf * tf * (BM25_K1 + 1) / (tf + BM25_K1 * (1 - BM25_B + BM25_B * length / self._avg_len))
+            scores.append(score)
+        return scores
+
+    def select(self, question, messages, definitions):
+        """
+        Returns the definitions to put in the prompt, in registration order
+        (so the same selection always yields the same system message).
+        """
+        if len(definitions) <= ROUTER_MIN_TOOLS:
+            return definitions
+        scores = self.scores(question, definitions)
+        if max(scores, default=0.0) < ROUTER_MIN_SCORE:
+            return definitions
+
+        ranked = sorted(range(len(definitions)), key=lambda i: -scores[i])
+        chosen = {i for i in ranked[:ROUTER_TOP_K] if scores[i] > 0}
+
+        recent = messages[-ROUTER_HISTORY_MESSAGES:]
+        used = {msg.get("name") for msg in recent if msg["role"] == "tool"}
+        recent_text = " ".join(msg["content"] for msg in recent)
+        for i, definition in enumerate(definitions):
+            name = definition.get("function", definition).get("name")
+            if name in used or name in recent_text:
+                chosen.add(i)
+        return [definitions[i] for i in sorted(chosen)]
+
+
+router = ToolRouter()
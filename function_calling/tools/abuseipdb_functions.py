@@ -1,11 +1,68 @@
-import requests
 import os
+import re
 import json
+import ipaddress
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
-from registry import register_tool
+from registry import register_tool, available_functions
+from tool_cache import CachePolicy, canonical_ip
+from rate_limit import rate_limited_request, RateLimited
+from intent_router import Intent
 
 load_dotenv()
 
+ABUSEIPDB_API_URL = os.environ.get("ABUSEIPDB_API_URL", "https://api.abuseipdb.com/api/v2")
+# Concurrent /check requests made by check_ip_reputation_bulk
+ABUSEIPDB_BULK_WORKERS = int(os.environ.get("ABUSEIPDB_BULK_WORKERS", "8"))
+# Most addresses one bulk call looks up (the free plan allows 1000 checks a day)
+ABUSEIPDB_BULK_MAX_IPS = int(os.environ.get("ABUSEIPDB_BULK_MAX_IPS", "250"))
+# Same threshold as the system prompt
+HIGHLY_ABUSIVE_SCORE = 85
+
+# IPv4 and IPv6 candidates in free text; ipaddress decides what is valid
+IP_PATTERN = re.compile(
+    r"(?<![\d.])(?:\d{1,3}\.){3}\d{1,3}(?!\.?\d)"
+    r"|(?<![\w:])(?:[0-9A-Fa-f]{0,4}:){2,7}[0-9A-Fa-f]{0,4}(?![\w:])"
+)
+
+_bulk_pool = ThreadPoolExecutor(max_workers=ABUSEIPDB_BULK_WORKERS, thread_name_prefix="abuseipdb")
+
+def project_ip_reputation(result):
+    data = result["data"]
+    return {
+        "ipAddress": data["ipAddress"],
+        "abuseConfidenceScore": data["abuseConfidenceScore"],
+        "totalReports": data.get("totalReports"),
+        "numDistinctUsers": data.get("numDistinctUsers"),
+        "lastReportedAt": data.get("lastReportedAt"),
+        "countryCode": data.get("countryCode"),
+        "isp": data.get("isp"),
+        "domain": data.get("domain"),
+        "usageType": data.get("usageType"),
+        "isWhitelisted": data.get("isWhitelisted"),
+        "isTor": data.get("isTor"),
+    }
+
+def project_ip_block(result):
+    data = result["data"]
+    reported = sorted(data.get("reportedAddress", []), key=lambda r: r.get("abuseConfidenceScore", 0), reverse=True)
+    return {
+        "networkAddress": data["networkAddress"],
+        "netmask": data.get("netmask"),
+        "numPossibleHosts": data.get("numPossibleHosts"),
+        "numReportedAddresses": len(reported),
+        "reportedAddress": [
+            {
+                "ipAddress": r["ipAddress"],
+                "abuseConfidenceScore": r.get("abuseConfidenceScore"),
+                "numReports": r.get("numReports"),
+                "countryCode": r.get("countryCode"),
+                "mostRecentReport": r.get("mostRecentReport"),
+            }
+            for r in reported
+        ],
+    }
+
 @register_tool("check_ip_reputation", {
     "type": "function",
     "function": {
@@ -20,13 +77,18 @@ load_dotenv()
             "required": ["ip_address"]
         }
     }
-})
+}, cache=CachePolicy(ttl=900, normalize={"ip_address": canonical_ip}), projector=project_ip_reputation, intents=[
+    Intent("{ip_address:ip}"),
+    Intent("(check|look up|lookup) (the )?(reputation of )?(ip )?{ip_address:ip}"),
+    Intent("(has|is|was) (ip )?{ip_address:ip} (been )?(abused|abusive|malicious|reported|blacklisted|flagged)"),
+    Intent("what is the (abuse )?(score|reputation) (of|for) (ip )?{ip_address:ip}"),
+])
 def check_ip_reputation(ip_address, max_age=90):
     key = os.environ['ABUSEIPDB_API_KEY']
-    url = "https://api.abuseipdb.com/api/v2/check"
+    url = f"{ABUSEIPDB_API_URL}/check"
     headers = {'Key': key, 'Accept': 'application/json'}
     params = {'ipAddress': ip_address, 'maxAgeInDays': max_age}
-    response = requests.get(url, headers=headers, params=params)
+    response = rate_limited_request("abuseipdb", "check", "GET", url, headers=headers, params=params)
     return response.text
 
 @register_tool("check_ip_block", {
@@ -42,11 +104,115 @@ def check_ip_reputation(ip_address, max_age=90):
             "required": ["block"]
         }
     }
-})
+}, cache=CachePolicy(ttl=900, normalize={"block": canonical_ip}), projector=project_ip_block, intents=[
+    Intent("{block:cidr}"),
+    Intent("(check|scan) (the )?((ip )?(block|range|network|subnet) )?{block:cidr}"),
+    Intent("(are there )?(any )?(abusive|malicious) (ips|addresses) in (the )?((ip )?(block|range|network|subnet) )?{block:cidr}"),
+])
 def check_ip_block(block):
     key = os.environ['ABUSEIPDB_API_KEY']
-    url = "https://api.abuseipdb.com/api/v2/check-block"
+    url = f"{ABUSEIPDB_API_URL}/check-block"
     headers = {'Key': key, 'Accept': 'application/json'}
     params = {'network': block, 'maxAgeInDays': 90}
-    response = requests.get(url, headers=headers, params=params)
-    return response.text
\ No newline at end of file
+    response = rate_limited_request("abuseipdb", "check-block", "GET", url, headers=headers, params=params)
+    return response.text
+
+def collect_ips(ip_addresses=None, text=None):
+    """
+    Normalizes and dedupes addresses given as a list and/or found in text
+    (defanged forms like 1.2.3[.]4 are accepted).
+    Returns (public addresses in first-seen order, duplicates, invalid list entries, non-public).
+    """
+    candidates = [(str(ip), True) for ip in ip_addresses or []]
+    if text:
+        # Text matches that are not addresses (timestamps, versions) are dropped silently
+        candidates += [(ip, False) for ip in IP_PATTERN.findall(text.replace("[.]", ".").replace("[:]", ":"))]
+    seen, unique, invalid, non_public = set(), [], [], []
+    duplicates = 0
+    for candidate, listed in candidates:
+        try:
+            ip = ipaddress.ip_address(candidate.strip().replace("[.]", "."))
+        except ValueError:
+            if listed:
+                invalid.append(candidate)
+            continue
+        if ip in seen:
+            duplicates += 1
+            continue
+        seen.add(ip)
+        if ip.is_global:
+            unique.append(str(ip))
+        else:
+            non_public.append(str(ip))
+    return unique, duplicates, invalid, non_public
+
+@register_tool("check_ip_reputation_bulk", {
+    "type": "function",
+    "function": {
+        "name": "check_ip_reputation_bulk",
+        "description": "Check the abuse reputation of many IP addresses at once (a list and/or IPs found in pasted text); returns a ranked summary",
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "ip_addresses": {"type": "array", "items": {"type": "string"}},
+                "text": {"type": "string", "description": "Free text (logs, alerts) to extract IP addresses from"},
+                "max_age": {"type": "integer", "default": 90},
+                "top": {"type": "integer", "default": 10, "description": "How many of the highest scores to list"}
+            }
+        }
+    }
+})
+def check_ip_reputation_bulk(ip_addresses=None, text=None, max_age=90, top=10):
+    """
+    Looks the addresses up concurrently through check_ip_reputation's cache
+    (so repeated and already-checked addresses cost no quota) and the shared
+    rate limiter; once the AbuseIPDB quota runs out, the remaining lookups fail
+    fast and are reported as not checked.
+    """
+    unique, duplicates, invalid, non_public = collect_ips(ip_addresses, text)
+    if not unique:
+        return {"status": "error", "error": "no_public_ip_addresses",
+                "invalid": invalid[:20], "non_public": non_public[:20]}
+    to_check, over_limit = unique[:ABUSEIPDB_BULK_MAX_IPS], unique[ABUSEIPDB_BULK_MAX_IPS:]
+    cache = available_functions["check_ip_reputation"].cache
+    retry_after = []
+
+    def lookup(ip):
+        try:
+            return ip, json.loads(cache.call(check_ip_reputation, {"ip_address": ip, "max_age": max_age}))
+        except RateLimited as e:
+            retry_after.append(e.retry_after)
+            return ip, None
+        except Exception as e:
+            return ip, {"errors": [{"detail": f"{type(e).__name__}: {e}"}]}
+
+    scores, errors, rate_limited = [], [], []
+    for ip, result in _bulk_pool.map(lookup, to_check):
+        if result is None:
+            rate_limited.append(ip)
+        elif "data" in result:
+            scores.append(project_ip_reputation(result))
+        else:
+            errors.append({"ipAddress": ip, "error": (result.get("errors") or [{}])[0].get("detail", "unknown error")})
+
+    scores.sort(key=lambda r: (r["abuseConfidenceScore"], r.get("totalReports") or 0), reverse=True)
+    summary = {
+        "status": "partial" if rate_limited or over_limit else "ok",
+        "checked": len(scores),
+        "threshold": HIGHLY_ABUSIVE_SCORE,
+        "above_threshold": sum(r["abuseConfidenceScore"] >= HIGHLY_ABUSIVE_SCORE for r in scores),
+        "top": [
+            {key: r[key] for key in ("ipAddress", "abuseConfidenceScore", "totalReports", "countryCode", "isp")}
+            for r in scores[:max(top, 0)]
+        ],
+        "skipped": {"duplicates": duplicates, "invalid": invalid[:20], "non_public": non_public[:20]},
+    }
+    if errors:
+        summary["errors"] = errors[:20]
+    if rate_limited:
+        summary["not_checked_rate_limited"] = {"count": len(rate_limited), "retry_after": round(min(retry_after)),
+                                               "ip_addresses": rate_limited[:20]}
+    if over_limit:
+        summary["not_checked_over_limit"] = {"count": len(over_limit), "limit": ABUSEIPDB_BULK_MAX_IPS,
+                                             "ip_addresses": over_limit[:20]}
+    return summary
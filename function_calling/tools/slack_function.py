@@ -2,6 +2,8 @@ import requests
 import os
 from dotenv import load_dotenv
 from registry import register_tool
+from slack_directory import directory, SlackDirectoryError, SLACK_API_URL
+from rate_limit import rate_limited_request
 
 load_dotenv()
 
@@ -25,10 +27,10 @@ load_dotenv()
             "required": ["channel", "message"]
         }
     }
-})
+}, side_effects=True)
 def send_slack_message(channel, message):
     slack_token = os.environ.get("SLACK_API_KEY")
-    url = "https://slack.com/api/chat.postMessage"
+    url = f"{SLACK_API_URL}/chat.postMessage"
     headers = {
         "Authorization": f"Bearer {slack_token}",
         "Content-Type": "application/json"
@@ -37,7 +39,7 @@ def send_slack_message(channel, message):
         "channel": channel,
         "text": message
     }
-    response = requests.post(url, headers=headers, json=payload)
+    response = rate_limited_request("slack", "chat.postMessage", "POST", url, headers=headers, json=payload)
     result = response.json()
 
     if response.status_code == 200 and result.get("ok"):
@@ -62,38 +64,27 @@ def send_slack_message(channel, message):
             "properties": {}
         }
     }
-})
+}, max_tokens=1000)
 def list_slack_channels():
-    slack_token = os.environ.get("SLACK_API_KEY")
-    url = "https://slack.com/api/conversations.list"
-    headers = {
-        "Authorization": f"Bearer {slack_token}"
-    }
-    params = {
-        "types": "public_channel,private_channel",
-        "limit": 1000
-    }
-    response = requests.get(url, headers=headers, params=params)
-    data = response.json()
-
-    if response.status_code == 200 and data.get("ok"):
-        channels = [
-            {
-                "name": ch["name"],
-                "id": ch["id"],
-                "is_private": ch["is_private"]
-            }
-            for ch in data.get("channels", [])
-        ]
-        return {
-            "status": "success",
-            "channels": channels
-        }
-    else:
+    try:
+        directory.ensure_fresh()
+    except (requests.RequestException, SlackDirectoryError) as e:
         return {
             "status": "error",
-            "error": data.get("error", "unknown_error")
+            "error": str(e) or "unknown_error"
         }
+    channels = [
+        {
+            "name": ch["name"],
+            "id": ch["id"],
+            "is_private": ch["is_private"]
+        }
+        for ch in directory.channels.values()
+    ]
+    return {
+        "status": "success",
+        "channels": channels
+    }
 
 @register_tool("lookup_slack_user", {
     "type": "function",
@@ -114,12 +105,12 @@ def list_slack_channels():
 })
 def lookup_slack_user(email):
     slack_token = os.environ.get("SLACK_API_KEY")
-    url = "https://slack.com/api/users.lookupByEmail"
+    url = f"{SLACK_API_URL}/users.lookupByEmail"
     headers = {
         "Authorization": f"Bearer {slack_token}"
     }
     params = {"email": email}
-    response = requests.get(url, headers=headers, params=params)
+    response = rate_limited_request("slack", "users.lookupByEmail", "GET", url, headers=headers, params=params)
     data = response.json()
 
     if response.status_code == 200 and data.get("ok"):
@@ -144,31 +135,65 @@ def lookup_slack_user(email):
             "properties": {}
         }
     }
-})
+}, max_tokens=1000)
 def list_slack_users():
-    slack_token = os.environ.get("SLACK_API_KEY")
-    url = "https://slack.com/api/users.list"
-    headers = {
-        "Authorization": f"Bearer {slack_token}"
+    try:
+        directory.ensure_fresh()
+    except (requests.RequestException, SlackDirectoryError) as e:
+        return {
+            "status": "error",
+            "error": str(e) or "unknown_error"
+        }
+    users = [
+        {
+            "id": u["id"],
+            "real_name": u.get("real_name"),
+            "email": u.get("email")
+        }
+        for u in directory.users.values()
+    ]
+    return {
+        "status": "success",
+        "users": users
     }
-    response = requests.get(url, headers=headers)
-    data = response.json()
 
-    if response.status_code == 200 and data.get("ok"):
-        users = [
-            {
-                "id": u["id"],
-                "real_name": u.get("real_name"),
-                "email": u.get("profile", {}).get("email")
-            }
-            for u in data.get("members", []) if not u.get("is_bot", False)
-        ]
-        return {
-            "status": "success",
-            "users": users
+@register_tool("resolve_slack_recipient", {
+    "type": "function",
+    "function": {
+        "name": "resolve_slack_recipient",
+        "description": "Find the Slack user or channel ID for a name, handle, email or channel name (returns only the best matches)",
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "query": {
+                    "type": "string",
+                    "description": "Name to look up (e.g. 'john doe', 'jdoe@example.com', '#alerts')"
+                },
+                "kind": {
+                    "type": "string",
+                    "enum": ["any", "user", "channel"],
+                    "default": "any"
+                },
+                "limit": {
+                    "type": "integer",
+                    "default": 5
+                }
+            },
+            "required": ["query"]
         }
-    else:
+    }
+})
+def resolve_slack_recipient(query, kind="any", limit=5):
+    try:
+        directory.ensure_fresh()
+    except (requests.RequestException, SlackDirectoryError) as e:
         return {
             "status": "error",
-            "error": data.get("error", "unknown_error")
+            "error": str(e) or "unknown_error"
         }
+    matches = directory.resolve(query, kind=kind, limit=limit)
+    return {
+        "status": "success",
+        "query": query,
+        "matches": matches
+    }
@@ -1,11 +1,48 @@
-import requests
 import os
-import json
 from dotenv import load_dotenv
 from registry import register_tool
+from tool_cache import CachePolicy, rounded, casefold
+from rate_limit import rate_limited_request
+from intent_router import Intent
 
 load_dotenv()
 
+OPENWEATHER_API_URL = os.environ.get("OPENWEATHER_API_URL", "https://api.openweathermap.org/data/2.5")
+
+def project_current_weather(result):
+    main = result["main"]
+    return {
+        "location": result.get("name"),
+        "temperature_c": main["temp"],
+        "feels_like_c": main.get("feels_like"),
+        "humidity_pct": main.get("humidity"),
+        "condition": result["weather"][0]["main"],
+        "description": result["weather"][0].get("description"),
+        "wind_speed_ms": result.get("wind", {}).get("speed"),
+    }
+
+def project_forecast(result):
+    # Collapse the 3-hourly entries into one summary per day
+    days = {}
+    for entry in result["list"]:
+        day = days.setdefault(entry["dt_txt"][:10], {"temps": [], "conditions": [], "pop": 0.0})
+        day["temps"] += [entry["main"]["temp_min"], entry["main"]["temp_max"]]
+        day["conditions"].append(entry["weather"][0]["main"])
+        day["pop"] = max(day["pop"], entry.get("pop", 0.0))
+    return {
+        "city": result.get("city", {}).get("name"),
+        "days": [
+            {
+                "date": date,
+                "min_c": round(min(day["temps"]), 1),
+                "max_c": round(max(day["temps"]), 1),
+                "conditions": max(set(day["conditions"]), key=day["conditions"].count),
+                "precipitation_chance_pct": round(day["pop"] * 100),
+            }
+            for date, day in days.items()
+        ],
+    }
+
 @register_tool("get_current_weather", {
     "type": "function",
     "function": {
@@ -20,11 +57,11 @@ load_dotenv()
             "required": ["latitude", "longitude"]
         }
     }
-})
+}, cache=CachePolicy(ttl=600, normalize={"latitude": rounded(2), "longitude": rounded(2)}), projector=project_current_weather)
 def get_current_weather(latitude, longitude):
     key = os.environ['WEATHERMAP_API_KEY']
-    url = f"https://api.openweathermap.org/data/2.5/weather?lat={latitude}&lon={longitude}&appid={key}&units=metric"
-    response = requests.get(url)
+    url = f"{OPENWEATHER_API_URL}/weather?lat={latitude}&lon={longitude}&appid={key}&units=metric"
+    response = rate_limited_request("openweather", "weather", "GET", url)
     return response.text
 
 @register_tool("get_forecast", {
@@ -40,9 +77,13 @@ def get_current_weather(latitude, longitude):
             "required": ["city"]
         }
     }
-})
+}, cache=CachePolicy(ttl=1800, normalize={"city": casefold}), projector=project_forecast, intents=[
+    Intent("(the )?(weather|forecast|weather forecast) (in|for) {city:place}( (today|tomorrow|this week))?"),
+    Intent("(what's|what is|how's|how is) the (weather|forecast|weather forecast) (like )?(in|for) {city:place}( (today|tomorrow|this week))?"),
+    Intent("(will it|is it going to) rain in {city:place}( (today|tomorrow|this week))?"),
+])
 def get_forecast(city):
     key = os.environ['WEATHERMAP_API_KEY']
-    url = f"https://api.openweathermap.org/data/2.5/forecast?q={city}&appid={key}&units=metric"
-    response = requests.get(url)
+    url = f"{OPENWEATHER_API_URL}/forecast?q={city}&appid={key}&units=metric"
+    response = rate_limited_request("openweather", "forecast", "GET", url)
     return response.text
\ No newline at end of file
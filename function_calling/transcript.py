@@ -0,0 +1,82 @@
+import os
+import json
+
+# Newest messages rendered in the chatbot; "Load earlier messages" adds another page of this size
+TRANSCRIPT_MESSAGES = int(os.environ.get("TRANSCRIPT_MESSAGES", "40"))
+# Characters of a tool output shown in its collapsed preview (the full output loads on click)
+TOOL_PREVIEW_CHARS = int(os.environ.get("TOOL_PREVIEW_CHARS", "300"))
+
+# What the browser receives stays bounded however long the session gets: at most
+# one page of messages, with tool outputs cut to a preview. Within a turn Gradio
+# only sends the difference between consecutive updates of the generator.
+
+
+def display_text(msg):
+    """
+    Chatbot text of a message: its content plus the display-only footer
+    (timings, notes), which is never sent back to the model.
+    """
+    if msg.get("footer"):
+        return f'{msg["content"]}\n\n{msg["footer"]}'
+    return msg["content"]
+
+
+def size_label(text):
+    size = len(text.encode())
+    return f"{size / 1024:.1f} KB" if size >= 1024 else f"{size} B"
+
+
+def tool_bubble(msg, index):
+    """
+    Collapsed tool output: a titled accordion holding a short preview.
+    The session index in metadata["id"] lets a click load the full output.
+    """
+    content = msg["content"]
+    preview = content if len(content) <= TOOL_PREVIEW_CHARS else content[:TOOL_PREVIEW_CHARS] + "…"
+    note = "" if preview is content else "\n\n_Click to show the full output below._"
+    return {
+        "role": "assistant",
+        "content": f"```json\n{preview}\n```{note}",
+        "metadata": {"title": f'🔧 {msg.get("name", "tool")}', "id": str(index),
+                     "log": size_label(content), "status": "done"},
+    }
+
+
+def hidden_count(messages, shown=TRANSCRIPT_MESSAGES):
+    return max(len(messages) - shown, 0)
+
+
+def render_transcript(messages, shown=TRANSCRIPT_MESSAGES):
+    """
+    Chatbot messages for the newest `shown` messages of the history.
+    """
+    start = hidden_count(messages, shown)
+    rendered = []
+    for index in range(start, len(messages)):
+        msg = messages[index]
+        if msg["role"] == "tool":
+            rendered.append(tool_bubble(msg, index))
+        else:
+            rendered.append({"role": msg["role"], "content": display_text(msg)})
+    return rendered
+
+
+def full_tool_output(messages, rendered, index):
+    """
+    (tool name, full output pretty-printed) for the clicked chatbot message,
+    or None if it is not a tool output.
+    """
+    if not isinstance(index, int):
+        index = index[0]
+    if not 0 <= index < len(rendered):
+        return None
+    source = (rendered[index].get("metadata") or {}).get("id")
+    if source is None or not source.isdigit() or int(source) >= len(messages):
+        return None
+    msg = messages[int(source)]
+    if msg["role"] != "tool":
+        return None
+    try:
+        return msg.get("name", "tool"), json.dumps(json.loads(msg["content"]), indent=2, ensure_ascii=False)
+    except ValueError:
+        return msg.get("name", "tool"), msg["content"]
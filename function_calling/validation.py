@@ -0,0 +1,147 @@
+import json
+
+# Coercions for values the LLM commonly emits with the wrong JSON type
+TRUE_STRINGS = {"true", "yes", "1"}
+FALSE_STRINGS = {"false", "no", "0"}
+
+
+class ArgumentError(Exception):
+    pass
+
+
+def _coerce_string(value):
+    if isinstance(value, str):
+        return value
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return str(value)
+    raise ArgumentError(f"expected string, got {type(value).__name__}")
+
+
+def _coerce_integer(value):
+    if isinstance(value, bool):
+        raise ArgumentError("expected integer, got boolean")
+    if isinstance(value, int):
+        return value
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    if isinstance(value, str):
+        try:
+            number = float(value.strip())
+        except ValueError:
+            raise ArgumentError(f"expected integer, got {value!r}")
+        if number.is_integer():
+            return int(number)
+    raise ArgumentError(f"expected integer, got {value!r}")
+
+
+def _coerce_number(value):
+    if isinstance(value, bool):
+        raise ArgumentError("expected number, got boolean")
+    if isinstance(value, (int, float)):
+        return value
+    if isinstance(value, str):
+        try:
+            return float(value.strip())
+        except ValueError:
+            pass
+    raise ArgumentError(f"expected number, got {value!r}")
+
+
+def _coerce_boolean(value):
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, str) and value.strip().lower() in TRUE_STRINGS | FALSE_STRINGS:
+        return value.strip().lower() in TRUE_STRINGS
+    raise ArgumentError(f"expected boolean, got {value!r}")
+
+
+def compile_schema(schema):
+    """
+    Compiles a JSON schema fragment into a function value -> coerced value
+    that raises ArgumentError. Supports the subset used by tool definitions:
+    type (string/integer/number/boolean/array/object), enum, items,
+    properties, required and default.
+    """
+    kind = schema.get("type")
+    enum = schema.get("enum")
+
+    if kind == "object":
+        check = compile_object(schema)
+    elif kind == "array":
+        check_item = compile_schema(schema.get("items", {}))
+
+        def check(value):
+            if isinstance(value, str):
+                try:
+                    value = json.loads(value)
+                except ValueError:
+                    value = [value]
+            if not isinstance(value, list):
+                value = [value]
+            return [check_item(item) for item in value]
+    else:
+        check = {
+            "string": _coerce_string,
+            "integer": _coerce_integer,
+            "number": _coerce_number,
+            "boolean": _coerce_boolean,
+        }.get(kind, lambda value: value)
+
+    if enum is None:
+        return check
+
+    def check_enum(value):
+        value = check(value)
+        if value not in enum:
+            raise ArgumentError(f"must be one of {enum}, got {value!r}")
+        return value
+    return check_enum
+
+
+def compile_object(schema):
+    """
+    Compiles an object schema into validate(args) -> (coerced args, errors).
+    Unknown arguments are rejected; missing optional ones get their defaults.
+    """
+    properties = {name: compile_schema(prop) for name, prop in schema.get("properties", {}).items()}
+    defaults = {
+        name: prop["default"]
+        for name, prop in schema.get("properties", {}).items() if "default" in prop
+    }
+    required = schema.get("required", [])
+
+    def validate(args):
+        if isinstance(args, str):
+            try:
+                args = json.loads(args) if args.strip() else {}
+            except ValueError:
+                return None, ["arguments must be a JSON object"]
+        if args is None:
+            args = {}
+        if not isinstance(args, dict):
+            return None, ["arguments must be a JSON object"]
+        errors = []
+        coerced = {}
+        for name, value in args.items():
+            if name not in properties:
+                errors.append(f"unknown argument '{name}'")
+                continue
+            try:
+                coerced[name] = properties[name](value)
+            except ArgumentError as e:
+                errors.append(f"'{name}': {e}")
+        for name in required:
+            if name not in args:
+                errors.append(f"missing required argument '{name}'")
+        for name, value in defaults.items():
+            coerced.setdefault(name, value)
+        return coerced, errors
+
+    def check(value):
+        coerced, errors = validate(value)
+        if errors:
+            raise ArgumentError("; ".join(errors))
+        return coerced
+
+    check.validate = validate
+    return check
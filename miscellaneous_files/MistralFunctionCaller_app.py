@@ -1,7 +1,6 @@
 import json
 import time
 import re
-import requests
 from rich.console import Console
 import gradio as gr
 
@@ -9,11 +8,10 @@ import gradio as gr
 import tools
 from registry import available_functions, definitions
 from template import function_calling_prompt_template, system_prompt, slack_prompt
+from llm_client import client
 
 console = Console()
 
-OLLAMA_URL = "http://localhost:11434/api/generate"
-HEADERS = {"Content-Type": "application/json"}
 MODEL = "gemma3:12b"
 
 
@@ -49,7 +47,7 @@ def extract_function_calls(question, history=None):
     }
 
     start = time.time()
-    response = requests.post(OLLAMA_URL, headers=HEADERS, data=json.dumps(data))
+    response = client.generate(data)
     end = time.time()
 
     if response.status_code != 200:
@@ -133,13 +131,9 @@ def answer_question(question, fn_responses, history=None, last_fn_response=None)
         "stream": True
     }
 
-    response = requests.post(OLLAMA_URL, headers=HEADERS, data=json.dumps(data), stream=True)
-
     answer = ""
-    for line in response.iter_lines():
-        if line:
-            chunk = json.loads(line)
-            answer += chunk.get("response", "")
+    for chunk in client.stream(data):
+        answer += chunk.get("response", "")
     return answer
 
 def format_history(history, max_turns=4):
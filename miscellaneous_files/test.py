@@ -1,18 +1,16 @@
 import json
 import time
 import re
-import requests
 from rich.console import Console
 
 # Load all tool modules via registry
 import tools
 from registry import available_functions, definitions
 from template import function_calling_prompt_template, system_prompt, slack_prompt, gmail_prompt
+from llm_client import client
 
 console = Console()
 
-OLLAMA_URL = "http://localhost:11434/api/generate"
-HEADERS = {"Content-Type": "application/json"}
 MODEL = "mistral:latest"
 
 
@@ -26,7 +24,7 @@ def extract_function_calls(question):
     }
 
     start = time.time()
-    response = requests.post(OLLAMA_URL, headers=HEADERS, data=json.dumps(data))
+    response = client.generate(data)
     end = time.time()
 
     if response.status_code != 200:
@@ -70,13 +68,9 @@ def answer_question(question, fn_responses):
         "stream": True
     }
 
-    response = requests.post(OLLAMA_URL, headers=HEADERS, data=json.dumps(data), stream=True)
-
     answer = ""
-    for line in response.iter_lines():
-        if line:
-            chunk = json.loads(line)
-            answer += chunk.get("response", "")
+    for chunk in client.stream(data):
+        answer += chunk.get("response", "")
     return answer
 
 